@@ -4,8 +4,8 @@ import logging
 import os
 import logging
 
-from aiohttp import web
-from aiohttp.web import Response, json_response, Application, Request
+from aiohttp import web, WSMsgType
+from aiohttp.web import Response, json_response, Application, Request, WebSocketResponse
 
 from src.offense.shortest_path_bot import ShortestPathBot
 from src.offense.offense_bot import DumbOffenseBot
@@ -14,36 +14,53 @@ from src.defense.defense import Defense
 
 from src.flag import ENFORCE_EASY
 
+from game_server_common import frames, helpers
+from game_server_common.base import MapEncoding, Transport
+from game_server_common.map import Map
+
 ENV_PORT = "PORT"
 ENV_MODE = "MODE"
 ENV_LEVEL = "BOT_LEVEL"
+ENV_MAP_ENCODING = "MAP_ENCODING"
+ENV_TILE_SIZE = "TILE_SIZE"
+ENV_TRANSPORT = "TRANSPORT"
 DEFAULT_PORT = 5001
 
 should_play_offense = True
 offense_bot: DumbOffenseBot | ShortestPathBot | None = None
 defense: Defense | None = None
 level: str = ""
+map_encoding: MapEncoding = MapEncoding.PNG
+tile_size: int | None = None
+transport: Transport = Transport.HTTP
 
 def play_offense(payload: dict) -> Response:
     data = payload["map"]
 
     logging.info(f"Playing offense {offense_bot.__class__.__name__}")
-    move = offense_bot.play(data)
-    logging.debug("Moved played: %s", move)
+    # The shortest path bot also sends its next moves, the server tells how many of them it played
+    if isinstance(offense_bot, ShortestPathBot):
+        moves = offense_bot.plan(data, payload.get("shape"), payload.get("executed_moves", 0))
+    else:
+        moves = [offense_bot.play(data, payload.get("shape"))]
+    logging.debug("Moves played: %s", moves)
 
-    if move is None:
+    if not moves or moves[0] is None:
         return Response(
             text="Unable to play",
             status=400
         )
 
-    return json_response({"move": move.value})
+    response = {"move": moves[0].value}
+    if len(moves) > 1:
+        response["moves"] = [move.value for move in moves[1:]]
+    return json_response(response)
 
 
 def play_defense(payload: dict) -> Response:
     data = payload["map"]
     logging.debug(f"Playing defense {defense.bot.__class__.__name__}")
-    result = defense.play(data)
+    result = defense.play(data, payload.get("shape"))
     if result is None:
         return Response(
             text="Unable to play",
@@ -75,6 +92,19 @@ async def start(request: Request):
         else:
             defense = Defense(BlockerDefenseBot(n_walls=n_walls))
 
+    options = {}
+    # Older game servers only send PNG frames
+    if map_encoding.value in data.get("map_encodings", []):
+        options["map_encoding"] = map_encoding.value
+    if tile_size is not None:
+        options["tile_size"] = tile_size
+    # The game server then opens /ws and sends the next requests through it
+    if transport != Transport.HTTP and transport.value in data.get("transports", []):
+        options["transport"] = transport.value
+
+    if options:
+        return json_response(options)
+
     return Response(
         text="OK",
         status=200
@@ -97,6 +127,40 @@ async def end_game(request: Request):
     )
 
 
+def play_frame(frame: bytes) -> bytes:
+    """Answer to a next move frame, empty if the bot cannot play"""
+    grid, fields = frames.decode_next_move(frame)
+    map: Map = helpers.parse_grid_array(grid)[0]
+
+    if should_play_offense:
+        if isinstance(offense_bot, ShortestPathBot):
+            moves = offense_bot.plan_map(map, fields.get("executed_moves", 0))
+        else:
+            moves = [offense_bot.play_map(map)]
+        logging.debug("Moves played: %s", moves)
+        return frames.encode_offense_moves(moves) if moves and moves[0] is not None else b""
+
+    result = defense.play_map(map)
+    logging.debug("%s", result)
+    return frames.encode_defense_move(*result) if result is not None else b""
+
+
+async def websocket(request: Request):
+    ws = WebSocketResponse()
+    await ws.prepare(request)
+
+    async for message in ws:
+        if message.type != WSMsgType.BINARY:
+            continue
+        if frames.get_frame_type(message.data) == frames.END_GAME_FRAME:
+            break
+
+        await ws.send_bytes(play_frame(message.data))
+
+    await ws.close()
+    return ws
+
+
 def setup_web_server(is_debug: bool) -> Application:
     extra_format = " %(module)s-%(funcName)s:" if is_debug else ":"
     logging.basicConfig(level=logging.DEBUG if is_debug else logging.WARNING,
@@ -108,6 +172,7 @@ def setup_web_server(is_debug: bool) -> Application:
     app.router.add_post("/start", start)
     app.router.add_post("/next_move", next_move)
     app.router.add_post("/end_game", end_game)
+    app.router.add_get("/ws", websocket)
 
     return app
 
@@ -118,8 +183,11 @@ def main() -> None:
         else DEFAULT_PORT
     is_debug = ENV_MODE not in os.environ or os.environ[ENV_MODE] == "debug"
 
-    global level
+    global level, map_encoding, tile_size, transport
     level = os.environ[ENV_LEVEL] if ENV_LEVEL in os.environ else "medium"
+    map_encoding = MapEncoding(os.environ.get(ENV_MAP_ENCODING, MapEncoding.PNG.value))
+    tile_size = int(os.environ[ENV_TILE_SIZE]) if ENV_TILE_SIZE in os.environ else None
+    transport = Transport(os.environ.get(ENV_TRANSPORT, Transport.HTTP.value))
 
     if ENFORCE_EASY:
         level = "easy"
@@ -28,12 +28,8 @@ class BlockerDefenseBot(DefenseBot):
             return DefenseMove.SKIP, Position(0, 0)
 
         # Place a block directly in front of the player
-        player_x, player_y = np.where(
-            map.map == ElementType.PLAYER_OFFENSE.value)
-        player_pos: Position = Position(int(player_x[0]), int(player_y[0]))
-
-        goal_x, goal_y = np.where(map.map == ElementType.GOAL.value)
-        goal_pos: Position = Position(int(goal_x[0]), int(goal_y[0]))
+        player_pos: Position = map.get_position(ElementType.PLAYER_OFFENSE)
+        goal_pos: Position = map.get_position(ElementType.GOAL)
 
         if goal_pos.x > player_pos.x:
             obstacle_pos: Position = Position(player_pos.x + 1, player_pos.y)
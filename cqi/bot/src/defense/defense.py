@@ -5,29 +5,29 @@ from game_server_common.map import Map
 
 
 class Defense:
-    block_size: tuple[int, int] | None
+    block_sizes: helpers.BlockSizeCache
     bot: DefenseBot
 
     def __init__(self, bot: DefenseBot) -> None:
-        self.block_size = None
+        self.block_sizes = helpers.BlockSizeCache()
         self.bot = bot
 
-    def _parse_map(self, img: str) -> Map | None:
-        data = helpers.parse_base64(img)
-
-        if self.block_size is None:
-            block_size = helpers.get_block_size(
-                data, ElementType.PLAYER_OFFENSE.to_color())
-            if block_size is None:
-                return None
-            self.block_size = block_size
-
-        data = helpers.parse_data(data, self.block_size)
+    def _parse_map(self, img: str, shape: tuple[int, int] | None) -> Map | None:
+        if shape is not None:
+            data = helpers.parse_grid(img, shape)
+        else:
+            data = helpers.parse_base64(img)
+            block_size = self.block_sizes.get(data, ElementType.PLAYER_OFFENSE.to_color())
+            data = helpers.parse_data(data, block_size)
 
         return data[0]
 
-    def play(self, img: str) -> tuple[DefenseMove, Position] | None:
-        if not (map := self._parse_map(img)):
+    def play(self, img: str, shape: tuple[int, int] | None = None) -> tuple[DefenseMove, Position] | None:
+        if not (map := self._parse_map(img, shape)):
             return None
 
+        return self.play_map(map)
+
+    def play_map(self, map: Map) -> tuple[DefenseMove, Position] | None:
+        """Plays on an already decoded map, as done by in process games"""
         return self.bot.play(map)
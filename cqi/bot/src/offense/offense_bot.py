@@ -21,13 +21,13 @@ class Limits:
 
 class DumbOffenseBot:
     map: dict[Position, Entry]
-    block_size: tuple[int, int]
+    block_sizes: helpers.BlockSizeCache
     current_position: Position
     limits: Limits
 
     def __init__(self) -> None:
         self.map = dict()
-        self.block_size = None
+        self.block_sizes = helpers.BlockSizeCache()
         self.current_position = Position(0, 0)
         self.limits = Limits(None, None, None, None)
 
@@ -51,26 +51,13 @@ class DumbOffenseBot:
             return [OffenseMove.DOWN, OffenseMove.RIGHT, OffenseMove.LEFT, OffenseMove.UP]
         return [OffenseMove.UP, OffenseMove.RIGHT, OffenseMove.LEFT, OffenseMove.DOWN]
 
-    def _parse_map(self, img: str) -> tuple[Map, Position, Position] | None:
-        data = helpers.parse_base64(img)
-
-        if self.block_size is None:
-            block_size = helpers.get_block_size(
-                data, ElementType.PLAYER_OFFENSE.to_color())
-            if block_size is None:
-                return None
-            self.block_size = block_size
-
-        data = helpers.parse_data(data, self.block_size)
-
-        map = data[0]
-        current_pos = data[1][ElementType.PLAYER_OFFENSE]
-        goal_pos = data[1][ElementType.GOAL]
+    def _parse_map(self, img: str, shape: tuple[int, int] | None) -> Map:
+        if shape is not None:
+            return helpers.parse_grid(img, shape)[0]
 
-        if len(current_pos) == 0:
-            return None
-
-        return map, current_pos[0], goal_pos[0] if len(goal_pos) > 0 else None
+        data = helpers.parse_base64(img)
+        block_size = self.block_sizes.get(data, ElementType.PLAYER_OFFENSE.to_color())
+        return helpers.parse_data(data, block_size)[0]
 
     def _set_current_position(self, move: OffenseMove) -> None:
         self.current_position = self.current_position + move.to_position()
@@ -127,17 +114,22 @@ class DumbOffenseBot:
         if OffenseMove.DOWN not in available_moves:
             self.limits.bottom = self.current_position.y
 
-    def play(self, img: str) -> OffenseMove | None:
-        if not (data := self._parse_map(img)):
+    def play(self, img: str, shape: tuple[int, int] | None = None) -> OffenseMove | None:
+        return self.play_map(self._parse_map(img, shape))
+
+    def play_map(self, map: Map) -> OffenseMove | None:
+        """Plays on an already decoded map, as done by in process games"""
+        if (map_pos := map.get_position(ElementType.PLAYER_OFFENSE)) is None:
             return None
-        map, map_pos, goal_pos = data
+        goal_pos = map.get_position(ElementType.GOAL)
 
         nearby_tiles = map.get_nearby_tiles(*map_pos)
         self._set_map_limits(nearby_tiles)
         available_moves = [tile for tile in nearby_tiles if tile[0].element in [
             ElementType.BACKGROUND, ElementType.GOAL, ElementType.LARGE_VISION]]
         
-        logging.debug(f"Map: {map.to_img_64().decode()}")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Map: {map.to_img_64().decode()}")
         logging.debug(available_moves)
 
         if len(available_moves) == 0:
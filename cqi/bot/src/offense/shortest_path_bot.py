@@ -3,63 +3,58 @@ import random
 import game_server_common.helpers as helpers
 import numpy as np
 
+from game_server_common import pathfinding
 from game_server_common.map import Map
 from game_server_common.base import ElementType, Position, OffenseMove
-from collections import deque
+
+EXPLORATION_ELEMENTS = pathfinding.PASSABLE_ELEMENTS | {ElementType.UNKNOWN}
+# Moves sent after the one to play, the game server plays them while the tiles in sight do not change
+MAX_QUEUED_MOVES = 8
+MAX_EXPLORATION_QUEUED_MOVES = 2
+
+def _to_move(start: Position, end: Position) -> OffenseMove:
+    if end.x < start.x:
+        return OffenseMove.LEFT
+    if end.x > start.x:
+        return OffenseMove.RIGHT
+    if end.y < start.y:
+        return OffenseMove.UP
+    return OffenseMove.DOWN
 
 class ShortestPathBot:
-    block_size: tuple[int, int]
-    prev_move: OffenseMove | None
+    block_sizes: helpers.BlockSizeCache
+    # Moves sent in the last response, the first one is played and the next ones may have been played from the queue
+    prev_moves: list[OffenseMove]
     aggregate_map: Map | None
     map_position: Position | None
     top_right_found = False
 
     def __init__(self) -> None:
-        self.block_size = None
-        self.prev_move = None
+        self.block_sizes = helpers.BlockSizeCache()
+        self.prev_moves = []
         self.aggregate_map = None
         self.map_position = None
         self.view_range = None
 
-    def _parse_map(self, img: str) -> tuple[Map, Position, Position] | None:
-        data = helpers.parse_base64(img)
-
-        if self.block_size is None:
-            block_size = helpers.get_block_size(
-                data, ElementType.PLAYER_OFFENSE.to_color())
-            if block_size is None:
-                return None
-            self.block_size = block_size
-
-        data = helpers.parse_data(data, self.block_size)
+    def _parse_map(self, img: str, shape: tuple[int, int] | None) -> Map:
+        if shape is not None:
+            return helpers.parse_grid(img, shape)[0]
 
-        map = data[0]
-        current_pos = data[1][ElementType.PLAYER_OFFENSE]
-
-        if len(current_pos) == 0:
-            return None
-
-        return map, current_pos[0]
+        data = helpers.parse_base64(img)
+        block_size = self.block_sizes.get(data, ElementType.PLAYER_OFFENSE.to_color())
+        return helpers.parse_data(data, block_size)[0]
 
     # Assumes that the player makes a valid move each turn
-    def _aggregate_map(self, new_map: Map, player_rel_pos: Position) -> None:
-        if self.prev_move is None or self.aggregate_map is None:
+    def _aggregate_map(self, new_map: Map, player_rel_pos: Position, executed_moves: int = 0) -> None:
+        if not self.prev_moves or self.aggregate_map is None:
             self.aggregate_map = new_map
             self.map_position = player_rel_pos
             return
         
-        # Calculate the offset of the new map relative to the old map using the previous move direction
+        # Calculate the offset of the new map relative to the old map using the moves played since
         offset: Position = Position(0, 0)
-        if self.prev_move == OffenseMove.UP:
-            offset = Position(0, -1)
-        elif self.prev_move == OffenseMove.DOWN:
-            offset = Position(0, 1)
-        elif self.prev_move == OffenseMove.LEFT:
-            offset = Position(-1, 0)
-        elif self.prev_move == OffenseMove.RIGHT:
-            offset = Position(1, 0)
-        elif self.prev_move == OffenseMove.SKIP:
-            offset = Position(0, 0)
+        for move in self.prev_moves[:1 + executed_moves]:
+            offset = offset + move.to_position()
 
         map_offset = (self.map_position + offset) - player_rel_pos  # Offset to go from new_map to old_map
 
@@ -81,17 +76,13 @@ class ShortestPathBot:
         aggregate_map[new_x_offset:new_x_offset + new_map.map.shape[0], new_y_offset:new_y_offset + new_map.map.shape[1]] = new_map.map
 
         self.aggregate_map = Map(aggregate_map)
-        player_x, player_y = np.where(
-            self.aggregate_map.map == ElementType.PLAYER_OFFENSE.value)
-        self.map_position = Position(int(player_x[0]), int(player_y[0]))
+        # The new map covers the previous player position, so the player follows from its position in the new map
+        self.map_position = player_rel_pos + Position(new_x_offset, new_y_offset)
 
     def _identify_target(self, view_range) -> Position:
         # Check if the goal is in view
-        goal_x, goal_y = np.where(
-            self.aggregate_map.map == ElementType.GOAL.value)
-        
-        if len(goal_x) != 0 and len(goal_y) != 0:
-            return Position(int(goal_x[0]), int(goal_y[0]))
+        if (goal := self.aggregate_map.get_position(ElementType.GOAL)) is not None:
+            return goal
         
         # If we discovered the right edge of the map
         if self.map_position.x + view_range >= self.aggregate_map.map.shape[0]:
@@ -111,47 +102,32 @@ class ShortestPathBot:
         return Position(target_x, target_y)        
 
     def get_shortest_path(self, target: Position) -> list[Position]:
-        # Compute shortest path to goal
-        path_map = self.aggregate_map.map.copy()
-        path_map[target.x, target.y] = ElementType.BACKGROUND.value
+        # Unknown tiles are assumed to be free until they are discovered
+        return pathfinding.shortest_path(self.aggregate_map.map, self.map_position, target, EXPLORATION_ELEMENTS)
 
-        queue: list[list[Position]] = []
-        queue.append([self.map_position])
-        path_map[self.map_position.x, self.map_position.y] = ElementType.VISITED.value
+    def play(self, img: str, shape: tuple[int, int] | None = None) -> OffenseMove | None:
+        return self.play_map(self._parse_map(img, shape))
 
-        found = False
-        path: list[Position] = []
-        while(len(queue) > 0):
-            path = queue.pop(0)
-            point = path[-1]
+    def play_map(self, current_map: Map) -> OffenseMove | None:
+        """Plays on an already decoded map, as done by in process games"""
+        moves = self.plan_map(current_map)
+        return moves[0] if moves else None
 
-            if point.x == target.x and point.y == target.y:
-                found = True
-                break
+    def plan(self, img: str, shape: tuple[int, int] | None = None, executed_moves: int = 0) -> list[OffenseMove] | None:
+        return self.plan_map(self._parse_map(img, shape), executed_moves)
 
-            # Check other points
-            next_points = [Position(point.x + 1, point.y), Position(point.x - 1, point.y), Position(point.x, point.y + 1), Position(point.x, point.y - 1)]
-            for next_point in next_points:
-                if next_point.x >= 0 and next_point.x < path_map.shape[0] and next_point.y >= 0 and next_point.y < path_map.shape[1]:
-                    if path_map[next_point.x, next_point.y] in [ElementType.BACKGROUND.value, ElementType.GOAL.value, ElementType.UNKNOWN.value, ElementType.LARGE_VISION.value]:
-                        path_map[next_point.x, next_point.y] = ElementType.VISITED.value
-                        queue.append(path + [next_point])
-        
-        if found:
-            return path
-        
-        return []
-
-    def play(self, img: str) -> OffenseMove | None:
-        if not (data := self._parse_map(img)):
+    def plan_map(self, current_map: Map, executed_moves: int = 0) -> list[OffenseMove] | None:
+        """Move to play followed by the next moves of the path through known tiles, executed_moves being the number
+        of queued moves of the previous plan that the server played"""
+        if (map_pos := current_map.get_position(ElementType.PLAYER_OFFENSE)) is None:
             return None
-        current_map, map_pos = data
 
         # Range of view of the player
         view_range = max(current_map.map.shape[0] - map_pos.x - 1, map_pos.x)
         
-        self._aggregate_map(current_map, map_pos)
-        logging.debug(f"Map: {self.aggregate_map.to_img_64().decode()}")
+        self._aggregate_map(current_map, map_pos, executed_moves)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f"Map: {self.aggregate_map.to_img_64().decode()}")
 
         target: Position = self._identify_target(view_range)
         logging.debug(f"Target: {target}")
@@ -164,19 +140,17 @@ class ShortestPathBot:
             logging.debug(f"No path found to target, playing random move")
             moves = [OffenseMove.LEFT, OffenseMove.RIGHT, OffenseMove.UP, OffenseMove.DOWN]
             index = random.randint(0, 3)
-            move = moves[index]
-            self.prev_move = move
-            return move
-        
-        next_spot = path[1]
-        if next_spot.x < self.map_position.x:
-            move = OffenseMove.LEFT
-        elif next_spot.x > self.map_position.x:
-            move = OffenseMove.RIGHT
-        elif next_spot.y < self.map_position.y:
-            move = OffenseMove.UP
-        else:
-            move = OffenseMove.DOWN
+            self.prev_moves = [moves[index]]
+            return list(self.prev_moves)
+
+        # Unknown tiles may be walls, only the moves through discovered tiles are queued. While the goal is not found,
+        # the target may change with each tile discovered and the queue is kept short.
+        n_queued = MAX_QUEUED_MOVES if self.aggregate_map.get_position(ElementType.GOAL) is not None else MAX_EXPLORATION_QUEUED_MOVES
+        planned = path[:2]
+        for position in path[2:n_queued + 2]:
+            if self.aggregate_map.map[position.x, position.y] == ElementType.UNKNOWN.value:
+                break
+            planned.append(position)
 
-        self.prev_move = move
-        return move
+        self.prev_moves = [_to_move(start, end) for start, end in zip(planned, planned[1:])]
+        return list(self.prev_moves)
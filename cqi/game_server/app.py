@@ -1,40 +1,96 @@
 #!/bin/env python3
 
+from contextlib import aclosing
 from dataclasses import asdict
 import logging
 import asyncio
 import os
-import time
 import signal
-import threading
 import uuid
 
-from typing import Callable, Iterable, TypeVar
-from threading import Thread
+from typing import Awaitable, Callable
 from aiohttp import web
 from aiohttp.web import Response, json_response, Application, Request
 
-from src.game_runner import Runner
+from src.bot_client import TIME_BUDGET, TURN_TIME, TimeBankSettings
+from src.game_runner import GameManager, MAX_GAMES, SerializedStatus
+from src.metrics import PROCESS_METRICS
 
-game_runner: Runner
-handler_thread: Thread
-
-T = TypeVar("T")
+game_manager: GameManager
 
 
 ENV_PORT = "PORT"
 ENV_MODE = "MODE"
+ENV_MAX_GAMES = "MAX_GAMES"
+ENV_WORKERS = "WORKERS"
+ENV_TURN_TIME = "TURN_TIME"
+ENV_TIME_BUDGET = "TIME_BUDGET"
 DEFAULT_PORT = 5000
+# Smaller bodies are not worth compressing
+GZIP_MIN_SIZE = 1024
 
 
-async def run_async(func: Callable[[Iterable], T], *args) -> T:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, func, *args)
+async def get_status(request: Request):
+    # Without an id, the routes act on the last launched game
+    status = game_manager.status(request.match_info.get("id"))
+    if status is None:
+        return Response(text="Unknown game", status=404)
 
+    if request.rel_url.query.get("format") == "replay":
+        return serialized_response(request, status.serialized_replay)
 
-async def get_status(request: Request):
-    status = await run_async(game_runner.status)
-    return json_response(dict(status))
+    return serialized_response(request, status.serialized)
+
+
+def serialized_response(request: Request, serialized: SerializedStatus) -> Response:
+    """Answers with the cached body, 304 when the client already has it and gzip compressed when accepted"""
+    response = Response(content_type="application/json", headers={"Vary": "Accept-Encoding"})
+    response.etag = serialized.etag
+
+    if request.if_none_match is not None and any(etag.value in (serialized.etag, "*") for etag in request.if_none_match):
+        response.set_status(304)
+        return response
+
+    if len(serialized.body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.headers["Content-Encoding"] = "gzip"
+        response.body = serialized.gzip_body
+    else:
+        response.body = serialized.body
+
+    return response
+
+
+async def stream(request: Request):
+    """Server-sent events of the steps of a game, as they are played"""
+    runner = game_manager.get(request.match_info.get("id"))
+    if runner is None:
+        return Response(text="Unknown game", status=404)
+
+    # Clients resume after the last step they received, see Runner.stream
+    try:
+        start = int(request.headers.get("Last-Event-ID", -1)) + 1
+    except ValueError:
+        return Response(text="Wrong Last-Event-ID", status=400)
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    async with aclosing(runner.stream(max(start, 0))) as events:
+        async for event in events:
+            await response.write(event)
+
+    await response.write_eof()
+    return response
+
+
+async def get_metrics(_: Request):
+    """Turn phase durations of every game played by the server, in the Prometheus text format"""
+    n_running = sum(runner.is_running for runner in game_manager.runners.values())
+    text = PROCESS_METRICS.to_prometheus("game_server_turn_phase_seconds") + \
+        "# HELP game_server_running_games Games being played\n" \
+        "# TYPE game_server_running_games gauge\n" \
+        f"game_server_running_games {n_running}\n"
+
+    return Response(body=text.encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
 
 
 async def run_game(request: Request):
@@ -55,13 +111,15 @@ async def run_game(request: Request):
     else:
         seed = uuid.uuid4().hex
 
-    await run_async(game_runner.launch_game, offense_bot_url, defense_bot_url, seed)
+    game_id = game_manager.launch_game(offense_bot_url, defense_bot_url, seed)
+    if game_id is None:
+        return Response(text="Too many games running", status=503)
 
-    return json_response({"status": "started"}, status=200)
+    return json_response({"status": "started", "id": game_id}, status=200)
 
 
 async def end_game(request: Request):
-    game_running = await run_async(game_runner.force_end_game)
+    game_running = await game_manager.force_end_game(request.match_info.get("id"))
     if not game_running:
         return Response(text="No game running", status=400)
 
@@ -69,7 +127,7 @@ async def end_game(request: Request):
 
 
 def initialize(is_debug: bool) -> None:
-    global game_runner, handler_thread
+    global game_manager
 
     extra_format = " %(module)s-%(funcName)s:" if is_debug else ":"
     logging.basicConfig(level=logging.DEBUG if is_debug else logging.INFO,
@@ -77,54 +135,69 @@ def initialize(is_debug: bool) -> None:
                             extra_format} %(message)s",
                         datefmt="%d-%m-%Y %H:%M:%S")
 
-    game_runner = Runner()
-    handler_thread = threading.Thread(target=game_runner.run, args=())
-    handler_thread.start()
+    max_games = int(os.environ.get(ENV_MAX_GAMES, MAX_GAMES))
+    workers = int(os.environ.get(ENV_WORKERS, 0))
+    # The time bank is only enabled when one of its settings is given, the bots otherwise have the flat timeout
+    time_bank_settings = None
+    if ENV_TURN_TIME in os.environ or ENV_TIME_BUDGET in os.environ:
+        time_bank_settings = TimeBankSettings(float(os.environ.get(ENV_TURN_TIME, TURN_TIME)), float(os.environ.get(ENV_TIME_BUDGET, TIME_BUDGET)))
+    game_manager = GameManager(is_debug, max_games, workers, time_bank_settings)
 
 
-def stop() -> None:
+async def stop(_: Application | None = None) -> None:
     logging.info("Stopping...")
-    game_runner.stop()
-    handler_thread.join()
+    await game_manager.stop()
 
 
 def setup_web_server() -> Application:
     app = web.Application(logger=logging.getLogger())
+    app.on_cleanup.append(stop)
 
     app.router.add_get("/status", get_status)
+    app.router.add_get("/status/{id}", get_status)
+    app.router.add_get("/metrics", get_metrics)
+    app.router.add_get("/stream", stream)
+    app.router.add_get("/stream/{id}", stream)
     app.router.add_post("/run_game", run_game)
     app.router.add_post("/force_end_game", end_game)
+    app.router.add_post("/force_end_game/{id}", end_game)
 
     return app
 
 
 def demo_mode() -> None:
+    asyncio.run(run_demo())
+
+
+async def run_demo() -> None:
     offense_url = os.environ["OFFENSE_URL"]
     defense_url = os.environ["DEFENSE_URL"]
 
     global should_stop
     should_stop = False
 
-    def stop(*_):
+    def request_stop(*_):
         global should_stop
         should_stop = True
-    signal.signal(signal.SIGINT, stop)
-    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
 
-    game_runner.launch_game(offense_url, defense_url, uuid.uuid4().hex, 200)
+    game_id = game_manager.launch_game(offense_url, defense_url, uuid.uuid4().hex, 200)
 
     DURATION = 15
     for _ in range(DURATION):
-        if should_stop or game_runner.status().is_over or not game_runner.status().is_running:
+        if should_stop or game_manager.status(game_id).is_over or not game_manager.status(game_id).is_running:
             break
-        time.sleep(1)
+        await asyncio.sleep(1)
 
-    status = game_runner.status()
+    status = game_manager.status(game_id)
     if status.is_over:
         logging.info("Final score: %s", status.score)
     else:
         logging.warning("Game not over")
 
+    await stop()
+
 
 def public_mode() -> None:
     offense_url = os.environ["OFFENSE_URL"]
@@ -136,18 +209,21 @@ def public_mode() -> None:
     if max_move is not None:
         max_move = int(max_move)
 
-    game_runner.launch_game(offense_url, defense_url, seed=seed, max_move=max_move)
+    async def launch_game(_: Application) -> None:
+        game_manager.launch_game(offense_url, defense_url, seed=seed, max_move=max_move)
 
-    launch_web_server()
+    launch_web_server(launch_game)
 
 
-def launch_web_server() -> None:
+def launch_web_server(on_startup: Callable[[Application], Awaitable[None]] | None = None) -> None:
     port = int(os.environ[ENV_PORT]) \
         if ENV_PORT in os.environ \
         else DEFAULT_PORT
     host = "0.0.0.0"
 
     app = setup_web_server()
+    if on_startup is not None:
+        app.on_startup.append(on_startup)
     logging.info("Starting game server on %s", f"{host}:{port}")
     web.run_app(app, host=host, port=port)
 
@@ -175,10 +251,7 @@ def main() -> None:
     if mode != "public":
         logging.info("Starting game server in %s mode", mode)
 
-    try:
-        launch()
-    finally:
-        stop()
+    launch()
 
 
 if __name__ == "__main__":
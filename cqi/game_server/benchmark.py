@@ -0,0 +1,618 @@
+#!/bin/env python3
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+
+from typing import Callable
+
+import numpy as np
+import requests
+
+import game_server_common.helpers as helpers
+from game_server_common import pathfinding
+from game_server_common.base import ElementType, MapEncoding, Position, Transport
+from game_server_common.map import render_grid
+from src.bot_client import BotResponse, CircuitBreaker, HttpBotClient, InProcessBotClient, TIME_BANK_EXHAUSTED, TimeBank, TimeBankSettings
+from src.map import GOAL_DISTANCE_ELEMENTS, Map, TILE_SIZE
+from src.game_handler import BotOptions, GameHandler, MIN_MAP_SIZE, MAX_MAP_SIZE, encode_map_payload
+from src.game_runner import GameManager, GameServerStatus, Runner
+from src.reference_bots import REFERENCE_BOTS
+from src.replay import GameReplay, replay_game, replay_step
+from src.logger import Logger
+from src.offense_player import OFFENSE_VISION_RADIUS
+from reference import (legacy_get_block_size, legacy_parse_data, legacy_render, legacy_shortest_path, legacy_to_img_64,
+                       play_random_game, random_map)
+from stub_bots import (EncodedInProcessBotClient, HangingBotHandler, RandomBotClient, SingleMoveInProcessBotClient, SlowBotHandler,
+                       StubBotHandler, game_data_body, play_game, start_bot_app, start_stub_bot)
+
+# The benchmarks only measure, the tests check the results against the reference implementations
+MAP_SIZES = range(MIN_MAP_SIZE, MAX_MAP_SIZE + 1, 5)
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Returns the best average duration of func in milliseconds"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+class Table:
+    """Prints rows right aligned under the column titles. A column is a title, or a (title, format) pair
+    for values not printed with the default format, which gives floats 3 decimals."""
+    titles: list[str]
+    formats: list[str]
+
+    def __init__(self, *columns: str | tuple[str, str], unit: str = "") -> None:
+        self.titles = [column if isinstance(column, str) else column[0] for column in columns]
+        self.formats = ["" if isinstance(column, str) else column[1] for column in columns]
+        print(" ".join(f"{title:>{self._width(title)}}" for title in self.titles) + (f"   ({unit})" if unit else ""))
+
+    @staticmethod
+    def _width(title: str) -> int:
+        return max(len(title), 8)
+
+    def row(self, *values: object) -> None:
+        cells = []
+        for title, format, value in zip(self.titles, self.formats, values, strict=True):
+            if not format and isinstance(value, float):
+                format = ".3f"
+            cells.append(f"{value:>{self._width(title)}{format}}")
+        print(" ".join(cells))
+
+
+def size_label(size: int) -> str:
+    return f"{size}x{size}"
+
+
+def bench_render(args: argparse.Namespace) -> None:
+    table = Table("size", "legacy render", "render", "legacy frame", "frame", "legacy offense", "offense", unit="ms")
+    for size in MAP_SIZES:
+        map, _ = random_map(size, args.seed)
+        position = Position(size // 2, size // 2)
+
+        legacy_render_time = measure(lambda: legacy_render(map), args.repeat)
+        render_time = measure(lambda: render_grid(map.map), args.repeat)
+        legacy_frame_time = measure(lambda: legacy_to_img_64(map, position), args.repeat)
+        frame_time = measure(lambda: map.to_img_64(position), args.repeat)
+        legacy_offense_time = measure(lambda: legacy_to_img_64(map, position, OFFENSE_VISION_RADIUS), args.repeat)
+        offense_time = measure(lambda: map.to_img_64(position, OFFENSE_VISION_RADIUS), args.repeat)
+        table.row(size_label(size), legacy_render_time, render_time, legacy_frame_time, frame_time, legacy_offense_time, offense_time)
+
+
+def bench_decode(args: argparse.Namespace) -> None:
+    table = Table("size", "legacy decode", "decode", unit="ms")
+    for size in MAP_SIZES:
+        map, _ = random_map(size, args.seed)
+        data = helpers.parse_base64(map.to_img_64(Position(0, 0)))
+        block_size = (TILE_SIZE, TILE_SIZE)
+
+        legacy_time = measure(lambda: legacy_parse_data(data, block_size), args.repeat)
+        decode_time = measure(lambda: helpers.parse_data(data, block_size), args.repeat)
+        table.row(size_label(size), legacy_time, decode_time)
+
+
+def bench_block_size(args: argparse.Namespace) -> None:
+    color = ElementType.PLAYER_OFFENSE.to_color()
+
+    table = Table("size", "legacy", "detect", "legacy (far)", "detect (far)", "legacy (no player)", "detect (no player)", unit="ms")
+    for size in MAP_SIZES:
+        map, offense_player = random_map(size, args.seed)
+        player = offense_player.position
+        data = helpers.parse_base64(map.to_img_64(player))
+
+        map.set(player.x, player.y, ElementType.BACKGROUND)
+        hidden_data = helpers.parse_base64(map.to_img_64(player))
+
+        # The scan stops on the first block of the color, a player on the last column is the longest scan
+        map.set(size - 1, size - 1, ElementType.PLAYER_OFFENSE)
+        far_data = helpers.parse_base64(map.to_img_64(player))
+
+        legacy_time = measure(lambda: legacy_get_block_size(data, color), 1)
+        detect_time = measure(lambda: helpers.get_block_size(data, color), args.repeat)
+        far_legacy_time = measure(lambda: legacy_get_block_size(far_data, color), 1)
+        far_detect_time = measure(lambda: helpers.get_block_size(far_data, color), args.repeat)
+        hidden_legacy_time = measure(lambda: legacy_get_block_size(hidden_data, color), 1)
+        hidden_detect_time = measure(lambda: helpers.BlockSizeCache().get(hidden_data, color), args.repeat)
+        table.row(size_label(size), legacy_time, detect_time, far_legacy_time, far_detect_time, hidden_legacy_time, hidden_detect_time)
+
+
+def bench_encoding(args: argparse.Namespace) -> None:
+    table = Table("size", "frame", "encoding", "bytes", "encode (ms)", "decode (ms)")
+    for size in MAP_SIZES:
+        map, offense_player = random_map(size, args.seed)
+        player = offense_player.position
+
+        for frame, visibility_range in [("defense", None), ("offense", OFFENSE_VISION_RADIUS)]:
+            for encoding in MapEncoding:
+                options = BotOptions(map_encoding=encoding)
+                block_sizes = helpers.BlockSizeCache()
+
+                def encode() -> str:
+                    return json.dumps(encode_map_payload(map.get_visible_grid(player, visibility_range), options))
+
+                def decode(body: str) -> tuple[Map, dict]:
+                    payload = json.loads(body)
+                    if "shape" in payload:
+                        return helpers.parse_grid(payload["map"], payload["shape"])
+                    data = helpers.parse_base64(payload["map"])
+                    return helpers.parse_data(data, block_sizes.get(data, ElementType.PLAYER_OFFENSE.to_color()))
+
+                body = encode()
+                encode_time = measure(encode, args.repeat)
+                decode_time = measure(lambda: decode(body), args.repeat)
+                table.row(size_label(size), frame, encoding.value, len(body), encode_time, decode_time)
+
+
+def bench_tile_size(args: argparse.Namespace) -> None:
+    table = Table("size", "frame", "tile", "bytes", "encode (ms)", "decode (ms)")
+    for size in MAP_SIZES:
+        map, offense_player = random_map(size, args.seed)
+
+        for frame, visibility_range in [("defense", None), ("offense", OFFENSE_VISION_RADIUS)]:
+            for tile_size in [TILE_SIZE, 10, 5, 2, 1]:
+                def encode() -> bytes:
+                    return map.to_img_64(offense_player.position, visibility_range, tile_size)
+
+                def decode(frame: bytes) -> tuple[Map, dict]:
+                    data = helpers.parse_base64(frame)
+                    return helpers.parse_data(data, helpers.get_block_size(data, ElementType.PLAYER_OFFENSE.to_color()))
+
+                frame_data = encode()
+                encode_time = measure(encode, args.repeat)
+                decode_time = measure(lambda: decode(frame_data), args.repeat)
+                table.row(size_label(size), frame, tile_size, len(frame_data), encode_time, decode_time)
+
+
+def bench_pathfinding(args: argparse.Namespace) -> None:
+    passable_values = [element.value for element in pathfinding.PASSABLE_ELEMENTS]
+
+    table = Table("size", ("walls", "g"), "legacy path", "path", "legacy exists", "exists", unit="ms")
+    for size in [40, 80, 160]:
+        for wall_ratio in [0.1, 0.3, 0.5]:
+            map, offense_player = random_map(size, args.seed, wall_ratio)
+            start = offense_player.position
+            repeat = max(1, args.repeat // (size // 40) ** 2)
+            legacy_path_time = measure(lambda: legacy_shortest_path(map.map, start, map.goal, passable_values, True), repeat)
+            path_time = measure(lambda: map.get_shortest_path(start), repeat)
+            legacy_exists_time = measure(lambda: len(legacy_shortest_path(map.map, start, map.goal, passable_values, False)) > 0, repeat)
+            exists_time = measure(lambda: map.path_exists(start), repeat)
+            table.row(size_label(size), wall_ratio, legacy_path_time, path_time, legacy_exists_time, exists_time)
+
+
+def bench_goal_distance(args: argparse.Namespace) -> None:
+    table = Table("size", "bfs per read", "cached", unit=f"ms, one wall and {args.reads} score reads per turn")
+    for size in [20, 40, 80]:
+        map, offense_player = random_map(size, args.seed, 0.1)
+        rng = random.Random(args.seed)
+        turns: list[Position] = [Position(rng.randint(0, size - 1), rng.randint(0, size - 1)) for _ in range(50)]
+
+        def play(read: Callable[[Position], int]) -> None:
+            played = map.map.copy()
+            for wall in turns:
+                if map.get(wall.x, wall.y).element == ElementType.BACKGROUND:
+                    map.set(wall.x, wall.y, ElementType.WALL)
+                    if not map.path_exists(offense_player.position):
+                        map.set(wall.x, wall.y, ElementType.BACKGROUND)
+                for _ in range(args.reads):
+                    read(offense_player.position)
+            for x, y in np.argwhere(map.map != played):
+                map.set(int(x), int(y), ElementType(played[x, y]))
+
+        legacy_time = measure(lambda: play(lambda position: len(map.get_shortest_path(position))), 1) / len(turns)
+        turn_time = measure(lambda: play(map.get_goal_distance), 1) / len(turns)
+        table.row(size_label(size), legacy_time, turn_time)
+
+
+def bench_blocking(args: argparse.Namespace) -> None:
+    table = Table("size", ("walls", "g"), "bfs per placement", "cut vertices", "goal path", unit="ms per turn, with the score read")
+    for size in [20, 40, 80, 160]:
+        for wall_ratio in [0.1, 0.3, 0.45]:
+            map, offense_player = random_map(size, args.seed, wall_ratio)
+            player = offense_player.position
+            candidates = [Position(int(x), int(y)) for x, y in np.argwhere(map.map == ElementType.BACKGROUND.value)]
+            turns = random.Random(args.seed).sample(candidates, min(len(candidates), 50))
+
+            def legacy_is_blocking(position: Position) -> bool:
+                map.set(position.x, position.y, ElementType.WALL)
+                is_blocking = not map.path_exists(player)
+                map.set(position.x, position.y, ElementType.BACKGROUND)
+                return is_blocking
+
+            def cut_vertices_is_blocking(position: Position) -> bool:
+                return pathfinding.CutVertices(map.map, map.goal, GOAL_DISTANCE_ELEMENTS).separates(position, player)
+
+            def play(is_blocking: Callable[[Position], bool]) -> None:
+                """A wall per turn where it does not cut the player, then the score read"""
+                played = map.map.copy()
+                for wall in turns:
+                    if not is_blocking(wall):
+                        map.set(wall.x, wall.y, ElementType.WALL)
+                    map.get_goal_distance(player)
+                for x, y in np.argwhere(map.map != played):
+                    map.set(int(x), int(y), ElementType(played[x, y]))
+
+            bfs_time = measure(lambda: play(legacy_is_blocking), 1) / len(turns)
+            cut_vertices_time = measure(lambda: play(cut_vertices_is_blocking), 1) / len(turns)
+            goal_path_time = measure(lambda: play(lambda position: map.is_blocking(position, player)), 1) / len(turns)
+            table.row(size_label(size), wall_ratio, bfs_time, cut_vertices_time, goal_path_time)
+
+
+def measure_memory(func: Callable[[], object]) -> tuple[object, float]:
+    """Returns the result of func and the memory it still holds in KiB"""
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024
+
+
+def bench_history(args: argparse.Namespace) -> None:
+    table = Table("size", "steps", ("full frames (KiB)", ".0f"), ("deltas (KiB)", ".0f"), "full frames (ms)", "deltas (ms)",
+                  ("rebuild (ms)", ".1f"))
+    for size in MAP_SIZES:
+        steps = play_random_game(size, args.seed)
+
+        def legacy_history() -> list[list[list[str]]]:
+            """Full frame per step, as Map.to_list() builds them"""
+            return [[[str(row) for row in col] for col in grid.tolist()] for grid, _, _ in steps]
+
+        def history() -> Logger:
+            logger = Logger()
+            for grid, score, vision_radius in steps:
+                logger.add_step(grid, score, vision_radius)
+            return logger
+
+        legacy_frames, legacy_memory = measure_memory(legacy_history)
+        logger, memory = measure_memory(history)
+
+        legacy_time = measure(legacy_history, 1) / len(steps)
+        add_time = measure(history, 1) / len(steps)
+        rebuild_time = measure(lambda: history().get(), 1)
+        table.row(size_label(size), len(steps), legacy_memory, memory, legacy_time, add_time, rebuild_time)
+
+
+def bench_replay(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    table = Table("seed", "steps", "steps json", "gzip", "replay json", "gzip", ("replay (ms)", ".1f"), ("step (ms)", ".1f"))
+    for seed in range(args.seed, args.seed + 5):
+        offense_bot, defense_bot = RandomBotClient(seed, True), RandomBotClient(seed, False)
+        game_handler = asyncio.run(play_game(GameHandler(offense_bot, defense_bot, None, random.Random(str(seed)))))
+
+        replay = GameReplay(str(seed), None, offense_bot.exchanges, defense_bot.exchanges)
+        steps_body = game_data_body(game_handler)
+        replay_body = json.dumps(dict(replay)).encode()
+
+        middle = len(game_handler.logger.get()) // 2
+
+        replay_time = measure(lambda: asyncio.run(replay_game(replay)), 1)
+        step_time = measure(lambda: asyncio.run(replay_step(replay, middle)), 1)
+        table.row(seed, game_handler.logger.n_steps, len(steps_body), len(gzip.compress(steps_body)), len(replay_body),
+                  len(gzip.compress(replay_body)), replay_time, step_time)
+
+
+def bench_status(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    table = Table("seed", "steps", "body", "gzip", ("dumps (ms)", ".2f"), ("first poll (ms)", ".2f"), ("next polls (ms)", ".4f"),
+                  ("frames (KiB)", ".0f"), ("kept (KiB)", ".0f"))
+    for seed in range(args.seed, args.seed + 5):
+        game_handler = asyncio.run(play_game(GameHandler(RandomBotClient(seed, True), RandomBotClient(seed, False), None,
+                                                         random.Random(str(seed)))))
+        new_status = lambda: GameServerStatus(False, True, game_handler.score, game_handler.get_data())
+
+        def polled_status() -> GameServerStatus:
+            polled = new_status()
+            polled.serialized.gzip_body
+            return polled
+
+        # Memory still held by the status of the finished game once polled, measured first as nothing is built yet,
+        # and memory of the full frames of the game
+        _, kept_memory = measure_memory(polled_status)
+        _, frames_memory = measure_memory(game_handler.logger.get)
+
+        status = new_status()
+        dumps_time = measure(lambda: json.dumps(dict(status)).encode(), args.repeat)
+        first_time = measure(lambda: new_status().serialized.gzip_body, 1)
+        next_time = measure(lambda: status.serialized.gzip_body, args.repeat)
+        table.row(seed, game_handler.logger.n_steps, len(status.serialized.body), len(status.serialized.gzip_body),
+                  dumps_time, first_time, next_time, frames_memory, kept_memory)
+
+
+def measure_peak_memory(func: Callable[[], object]) -> float:
+    """Returns the peak memory allocated by func in KiB"""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def bench_stream(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    table = Table("seed", "steps", ("status body (peak KiB)", ".0f"), ("stream (peak KiB)", ".0f"), ("status body (ms)", ".1f"),
+                  ("stream (ms)", ".1f"))
+    for seed in range(args.seed, args.seed + 5):
+        runner = Runner()
+        runner.game_handler = GameHandler(RandomBotClient(seed, True), RandomBotClient(seed, False), None, random.Random(str(seed)))
+        asyncio.run(runner._play_game(runner.game_handler))
+
+        async def drain_stream() -> None:
+            async for _ in runner.stream():
+                pass
+
+        status_body = lambda: json.dumps(dict(GameServerStatus(False, True, runner.game_handler.score, runner.game_handler.get_data()))).encode()
+        status_memory = measure_peak_memory(status_body)
+        stream_memory = measure_peak_memory(lambda: asyncio.run(drain_stream()))
+        status_time = measure(status_body, 1)
+        stream_time = measure(lambda: asyncio.run(drain_stream()), 1)
+        table.row(seed, runner.game_handler.logger.n_steps, status_memory, stream_memory, status_time, stream_time)
+
+
+class LegacyHttpBotClient(HttpBotClient):
+    """Client opening a connection per request, used as a reference for the keep-alive one"""
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        response = requests.post(self.url + endpoint, json=json, timeout=timeout)
+        return BotResponse(response.status_code, response.text)
+
+    @property
+    def n_connections(self) -> int:
+        return self.n_requests
+
+
+def bench_connections(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    server = start_stub_bot()
+    url = f"http://localhost:{server.server_address[1]}"
+
+    table = Table("client", "requests", "connections", ("turn (ms)", ".2f"))
+    for name, client_type in [("per request", LegacyHttpBotClient), ("keep-alive", HttpBotClient)]:
+        offense_bot, defense_bot = client_type(url), client_type(url)
+        game_handler = GameHandler(offense_bot, defense_bot, None, random.Random(str(args.seed)))
+
+        async def play_turns() -> float:
+            await game_handler.start_game()
+            start = time.perf_counter()
+            while not game_handler.is_over:
+                await game_handler.play()
+            turn_time = (time.perf_counter() - start) / game_handler.move_count * 1000
+            await game_handler.close()
+            return turn_time
+
+        turn_time = asyncio.run(play_turns())
+        n_requests = offense_bot.n_requests + defense_bot.n_requests
+        n_connections = offense_bot.n_connections + defense_bot.n_connections
+        table.row(name, n_requests, n_connections, turn_time)
+    server.shutdown()
+
+
+async def measure_launches(url: str, n_launches: int, rng: random.Random) -> list[float]:
+    """Milliseconds from launch_game to the first /next_move received by the stub bot"""
+    runner = Runner()
+    latencies: list[float] = []
+    for launch in range(n_launches):
+        await asyncio.sleep(rng.random() / 10)
+        StubBotHandler.first_turn.clear()
+        start = time.perf_counter()
+        runner.launch_game(url, url, str(launch), max_move=5)
+        if not await asyncio.to_thread(StubBotHandler.first_turn.wait, 5):
+            raise RuntimeError("No turn played by the runner")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await runner.force_end_game()
+
+    await runner.stop()
+    return latencies
+
+
+def bench_launch(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    server = start_stub_bot()
+    url = f"http://localhost:{server.server_address[1]}"
+
+    # Both bots answer /start after the delay, they are started concurrently
+    table = Table("start delay (ms)", "launches", ("mean (ms)", ".1f"), ("max (ms)", ".1f"))
+    for start_delay in [0, 100]:
+        StubBotHandler.start_delay = start_delay / 1000
+        latencies = asyncio.run(measure_launches(url, min(args.repeat, 10), random.Random(args.seed)))
+        table.row(start_delay, len(latencies), sum(latencies) / len(latencies), max(latencies))
+    server.shutdown()
+
+
+async def play_games(url: str, n_games: int, workers: int) -> float:
+    """Seconds to play n_games concurrent games against the stub bot"""
+    game_manager = GameManager(max_games=n_games, workers=workers)
+    start = time.perf_counter()
+    game_ids = [game_manager.launch_game(url, url, str(game), max_move=40) for game in range(n_games)]
+    while any(game_manager.status(game_id).is_running or not game_manager.status(game_id).is_over for game_id in game_ids):
+        await asyncio.sleep(0.01)
+    duration = time.perf_counter() - start
+
+    await game_manager.stop()
+    return duration
+
+
+def bench_games(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    server = start_stub_bot()
+    url = f"http://localhost:{server.server_address[1]}"
+
+    table = Table("games", "workers", ("time (s)", ".2f"), ("games/s", ".1f"))
+    for n_games in [1, 8, 32]:
+        for workers in [0, 4]:
+            duration = asyncio.run(play_games(url, n_games, workers))
+            table.row(n_games, workers, duration, n_games / duration)
+    server.shutdown()
+
+
+def bench_move_queue(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    seeds = [str(seed) for seed in range(args.seed, args.seed + 20)]
+
+    table = Table("defense", "queue", "moves", "offense calls", ("mean score", ".1f"), ("ms/game", ".1f"))
+    for defense in ["blocker", "random"]:
+        for name, client_type in [("off", SingleMoveInProcessBotClient), ("on", InProcessBotClient)]:
+            n_moves, n_calls, scores = 0, 0, []
+            start = time.perf_counter()
+            for seed in seeds:
+                random.seed(seed)
+                np.random.seed(args.seed)
+                offense_bot = client_type(REFERENCE_BOTS["shortest_path"])
+                game_handler = GameHandler(offense_bot, InProcessBotClient(REFERENCE_BOTS[defense]), None, random.Random(seed))
+                asyncio.run(play_game(game_handler))
+                n_moves += game_handler.move_count
+                n_calls += sum(exchange.response is not None for exchange in offense_bot.exchanges) - 1
+                scores.append(game_handler.score)
+            duration = (time.perf_counter() - start) * 1000 / len(seeds)
+            table.row(defense, name, n_moves, n_calls, np.mean(scores), duration)
+
+
+def bench_transport(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    seeds = [str(seed) for seed in range(args.seed, args.seed + 5)]
+    transports = [("http png", {}), ("http grid", {"MAP_ENCODING": MapEncoding.GRID.value}),
+                  ("websocket", {"TRANSPORT": Transport.WEBSOCKET.value})]
+
+    table = Table("transport", "moves", ("turn (ms)", ".2f"))
+    for name, env in transports:
+        bots = [start_bot_app(env) for _ in range(2)]
+        try:
+            n_moves, duration = 0, 0.0
+            for seed in seeds:
+                random.seed(seed)
+                offense_bot, defense_bot = HttpBotClient(bots[0][1]), HttpBotClient(bots[1][1])
+                game_handler = GameHandler(offense_bot, defense_bot, None, random.Random(seed))
+
+                async def play_turns() -> float:
+                    await game_handler.start_game()
+                    start = time.perf_counter()
+                    while not game_handler.is_over:
+                        await game_handler.play()
+                    await game_handler.close()
+                    return time.perf_counter() - start
+
+                duration += asyncio.run(play_turns())
+                n_moves += game_handler.move_count
+        finally:
+            for process, _ in bots:
+                process.kill()
+                process.wait()
+
+        table.row(name, n_moves, duration * 1000 / n_moves)
+
+
+def bench_in_process(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    seeds = [str(seed) for seed in range(args.seed, args.seed + 10)]
+
+    def play_reference_games(client_type: type[InProcessBotClient], offense: str, defense: str) -> list[str]:
+        games = []
+        for seed in seeds:
+            # The reference bots draw from the global generator when they have no path
+            random.seed(seed)
+            game_handler = GameHandler(client_type(REFERENCE_BOTS[offense]), client_type(REFERENCE_BOTS[defense]), None, random.Random(seed))
+            games.append(game_data_body(asyncio.run(play_game(game_handler))).decode())
+        return games
+
+    table = Table("offense", "defense", ("encoded (ms/game)", ".1f"), ("grid (ms/game)", ".1f"), ("games/min", ".0f"))
+    for offense, defense in [("shortest_path", "blocker"), ("dumb", "random")]:
+        np.random.seed(args.seed)
+        encoded_time = measure(lambda: play_reference_games(EncodedInProcessBotClient, offense, defense), 1) / len(seeds)
+        grid_time = measure(lambda: play_reference_games(InProcessBotClient, offense, defense), 1) / len(seeds)
+        table.row(offense, defense, encoded_time, grid_time, 60_000 / grid_time)
+
+
+def bench_dead_bot(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    stub_url = f"http://localhost:{start_stub_bot().server_address[1]}"
+    hanging_url = f"http://localhost:{start_stub_bot(HangingBotHandler).server_address[1]}"
+
+    async def play(breaker: CircuitBreaker, max_move: int | None) -> tuple[GameHandler, float]:
+        offense_bot = HttpBotClient(hanging_url)
+        offense_bot.breaker = breaker
+        game_handler = GameHandler(offense_bot, HttpBotClient(stub_url), max_move, random.Random(str(args.seed)))
+        start = time.perf_counter()
+        await play_game(game_handler)
+        duration = time.perf_counter() - start
+        await game_handler.close()
+        return game_handler, duration
+
+    # Without the breaker each move waits for the timeout, so only the short game is played
+    table = Table("breaker", "moves", "score", "requests", "timeouts", ("game (s)", ".1f"))
+    for name, breaker, max_move in [("off", CircuitBreaker(threshold=sys.maxsize), 20), ("on", CircuitBreaker(), 20), ("on", CircuitBreaker(), None)]:
+        game_handler, duration = asyncio.run(play(breaker, max_move))
+        n_timeouts = sum("timed out" in (exchange.error or "") for exchange in game_handler.offense_bot.exchanges)
+        table.row(name, game_handler.move_count, game_handler.score, game_handler.offense_bot.n_requests, n_timeouts, duration)
+
+
+def bench_time_bank(args: argparse.Namespace) -> None:
+    logging.disable(logging.ERROR)
+    stub_url = f"http://localhost:{start_stub_bot().server_address[1]}"
+    slow_url = f"http://localhost:{start_stub_bot(SlowBotHandler).server_address[1]}"
+    settings = TimeBankSettings(turn_time=0.1, budget=1.0)
+
+    async def play(time_bank: TimeBank | None) -> tuple[GameHandler, float]:
+        offense_bot = HttpBotClient(slow_url)
+        offense_bot.time_bank = time_bank
+        game_handler = GameHandler(offense_bot, HttpBotClient(stub_url, settings), 20, random.Random(str(args.seed)))
+        start = time.perf_counter()
+        await play_game(game_handler)
+        duration = time.perf_counter() - start
+        await game_handler.close()
+        return game_handler, duration
+
+    print(f"turn time {settings.turn_time} s, budget {settings.budget} s, 20 moves")
+    table = Table(("answer (s)", "g"), "time bank", "forfeited", ("game (s)", ".2f"))
+    for delay in [0.05, 0.15, 0.3]:
+        SlowBotHandler.delay = delay
+        for time_bank in [None, TimeBank(settings)]:
+            game_handler, duration = asyncio.run(play(time_bank))
+            forfeited = sum(exchange.error == TIME_BANK_EXHAUSTED for exchange in game_handler.offense_bot.exchanges)
+            table.row(delay, "on" if time_bank is not None else "off", forfeited, duration)
+
+
+BENCHMARKS: dict[str, Callable[[argparse.Namespace], None]] = {
+    "render": bench_render,
+    "decode": bench_decode,
+    "block_size": bench_block_size,
+    "encoding": bench_encoding,
+    "tile_size": bench_tile_size,
+    "pathfinding": bench_pathfinding,
+    "goal_distance": bench_goal_distance,
+    "blocking": bench_blocking,
+    "history": bench_history,
+    "replay": bench_replay,
+    "status": bench_status,
+    "stream": bench_stream,
+    "launch": bench_launch,
+    "connections": bench_connections,
+    "dead_bot": bench_dead_bot,
+    "time_bank": bench_time_bank,
+    "games": bench_games,
+    "in_process": bench_in_process,
+    "move_queue": bench_move_queue,
+    "transport": bench_transport,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Game server micro benchmarks")
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reads", type=int, default=4)
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Reference implementations replaced by faster ones, and the random maps the tests and benchmark.py compare them on"""
+import base64
+import random
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageColor
+
+from game_server_common.base import ELEMENT_TYPE_TO_COLOR, ElementType, OffenseMove, Position
+from src.map import Map, TILE_SIZE
+from src.logger import Logger
+from src.offense_player import OffensePlayer
+
+RANDOM_ELEMENTS = [ElementType.WALL, ElementType.LARGE_VISION, ElementType.TIMEBOMB,
+                   ElementType.TIMEBOMB_SECOND_ROUND, ElementType.TIMEBOMB_THIRD_ROUND]
+
+
+def random_map(size: int, seed: int, wall_ratio: float = 0.2) -> tuple[Map, OffensePlayer]:
+    random.seed(seed)
+    map = Map.create_map(random.Random(seed), size, size)
+
+    for x in range(map.width):
+        for y in range(map.height):
+            if map.get(x, y).element == ElementType.BACKGROUND and random.random() < wall_ratio:
+                map.set(x, y, random.choice(RANDOM_ELEMENTS))
+
+    return map, OffensePlayer(map, Logger())
+
+
+def legacy_render(map: Map) -> Image.Image:
+    """Per tile renderer, used as a reference for the vectorized one"""
+    image = Image.new("RGB", (map.width * TILE_SIZE, map.height * TILE_SIZE), color=ElementType.BACKGROUND.to_color())
+
+    for x in range(map.width):
+        for y in range(map.height):
+            element_type = ElementType(map.map[x, y])
+            if element_type is not ElementType.BACKGROUND:
+                image.paste(element_type.to_color(), (x * TILE_SIZE, y * TILE_SIZE, (x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE))
+
+    return image
+
+
+def legacy_to_img_64(map: Map, offense_position: Position, visibility_range: int = None) -> bytes:
+    image = legacy_render(map)
+
+    if visibility_range is not None:
+        left = max(0, offense_position.x - visibility_range)
+        right = min(map.width, offense_position.x + visibility_range + 1)
+        upper = max(0, offense_position.y - visibility_range)
+        lower = min(map.height, offense_position.y + visibility_range + 1)
+        image = image.crop(tuple([value * TILE_SIZE for value in [left, upper, right, lower]]))
+
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue())
+
+
+def legacy_parse_data(data: np.ndarray, block_size: tuple[int, int]) -> tuple[np.ndarray, dict[ElementType, list[Position]]]:
+    """Per tile decoder, used as a reference for the vectorized one"""
+    size = (data.shape[0] // block_size[0], data.shape[1] // block_size[1])
+    element_positions = {ElementType.GOAL: [], ElementType.PLAYER_OFFENSE: []}
+    output_map = np.zeros(size).astype(np.int32)
+
+    for i in range(size[0]):
+        for j in range(size[1]):
+            r, g, b = data[(i * block_size[0]) + block_size[0] // 2, (j * block_size[1]) + block_size[1] // 2]
+            hex_color = "#{:02x}{:02x}{:02x}".format(r, g, b).upper()
+            element = next(element for element, color in ELEMENT_TYPE_TO_COLOR.items() if color == hex_color)
+            output_map[i, j] = element.value
+            if element in element_positions:
+                element_positions[element].append(Position(i, j))
+
+    return output_map, element_positions
+
+
+def legacy_get_block_size(data: np.ndarray, color: str) -> tuple[int, int] | None:
+    """Per pixel block size detection, used as a reference for the vectorized one"""
+    rgb_color = np.array(ImageColor.getrgb(color))
+
+    start: tuple[int, int] | None = None
+    for i in range(data.shape[0]):
+        for j in range(data.shape[1]):
+            if (data[i, j] == rgb_color).all():
+                start = (i, j)
+                break
+        if start is not None:
+            break
+
+    if start is None:
+        return None
+
+    size = [data.shape[0] - start[0], data.shape[1] - start[1]]
+    for i in range(data.shape[0] - start[0]):
+        if (data[start[0] + i, start[1]] != rgb_color).any():
+            size[0] = i
+            break
+    for j in range(data.shape[1] - start[1]):
+        if (data[start[0], start[1] + j] != rgb_color).any():
+            size[1] = j
+            break
+
+    return tuple(size)
+
+
+def legacy_shortest_path(grid: np.ndarray, start: Position, end: Position, passable: list[int], fallback_to_last: bool) -> list[Position]:
+    """Path copying breadth-first search, used as a reference for the pathfinding module"""
+    path_map = grid.copy()
+    path_map[end.x, end.y] = ElementType.BACKGROUND.value
+
+    queue: list[list[Position]] = [[start]]
+    path_map[start.x, start.y] = ElementType.VISITED.value
+
+    found = False
+    path: list[Position] = []
+    while len(queue) > 0:
+        path = queue.pop(0)
+        point = path[-1]
+
+        if point.x == end.x and point.y == end.y:
+            found = True
+            break
+
+        next_points = [Position(point.x + 1, point.y), Position(point.x - 1, point.y), Position(point.x, point.y + 1), Position(point.x, point.y - 1)]
+        for next_point in next_points:
+            if 0 <= next_point.x < path_map.shape[0] and 0 <= next_point.y < path_map.shape[1]:
+                if path_map[next_point.x, next_point.y] in passable:
+                    path_map[next_point.x, next_point.y] = ElementType.VISITED.value
+                    queue.append(path + [next_point])
+
+    return path if found or fallback_to_last else []
+
+
+def play_random_game(size: int, seed: int) -> list[tuple[np.ndarray, int, int]]:
+    """Maps, scores and vision radii of a max length game where the offense moves and a wall is placed at random each turn"""
+    map, offense_player = random_map(size, seed)
+    rng = random.Random(seed)
+    steps = [(map.map.copy(), 0, offense_player.get_vision_radius())]
+    for turn in range((size + size) * 4):
+        background = np.argwhere(map.map == ElementType.BACKGROUND.value)
+        x, y = background[rng.randrange(len(background))]
+        map.set(int(x), int(y), ElementType.WALL)
+        offense_player.move(rng.choice(list(OffenseMove)))
+        steps.append((map.map.copy(), turn, offense_player.get_vision_radius()))
+    return steps
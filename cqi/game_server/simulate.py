@@ -0,0 +1,155 @@
+#!/bin/env python3
+
+import argparse
+import asyncio
+import csv
+import itertools
+import logging
+import os
+import random
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import astuple, dataclass, fields
+from typing import Callable
+
+import numpy as np
+
+from src.bot_client import BotResponse, InProcessBot, InProcessBotClient
+from src.game_handler import GameHandler
+from src.metrics import TurnMetrics
+from src.reference_bots import REFERENCE_BOTS
+
+OFFENSE_BOTS = ["shortest_path", "dumb"]
+DEFENSE_BOTS = ["blocker", "random"]
+
+
+@dataclass
+class GameResult:
+    """One row of the results file"""
+    offense: str
+    defense: str
+    seed: str
+    score: int
+    moves: int
+    max_moves: int
+    reached_goal: bool
+    error: str
+    duration_ms: float
+    offense_ms: float
+    defense_ms: float
+
+
+class TimedBotClient(InProcessBotClient):
+    """Adds up the time spent by the bot answering"""
+    duration: float
+
+    def __init__(self, create_bot: Callable[[dict], InProcessBot]) -> None:
+        super().__init__(create_bot)
+        self.duration = 0
+
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        start = time.perf_counter()
+        try:
+            return await super()._post(endpoint, json, timeout)
+        finally:
+            self.duration += time.perf_counter() - start
+
+
+async def _play(game_handler: GameHandler) -> None:
+    await game_handler.start_game()
+    while not game_handler.is_over:
+        await game_handler.play()
+    await game_handler.end_game()
+    await game_handler.close()
+
+
+def play_game(offense: str, defense: str, seed: str, max_move: int | None = None) -> GameResult:
+    """Plays a full game between two reference bots, a module function so it can run in a worker process"""
+    # The reference bots draw from the global generators, they are seeded so a game only depends on its seed
+    random.seed(seed)
+    np.random.seed(zlib.crc32(seed.encode()))
+
+    offense_bot, defense_bot = TimedBotClient(REFERENCE_BOTS[offense]), TimedBotClient(REFERENCE_BOTS[defense])
+    game_handler = GameHandler(offense_bot, defense_bot, max_move, random.Random(seed), metrics=TurnMetrics())
+
+    start = time.perf_counter()
+    asyncio.run(_play(game_handler))
+    duration = time.perf_counter() - start
+
+    reached_goal = game_handler.offense_player is not None and game_handler.map.goal == game_handler.offense_player.position
+    return GameResult(offense=offense,
+                      defense=defense,
+                      seed=seed,
+                      score=game_handler.score or 0,
+                      moves=game_handler.move_count,
+                      max_moves=game_handler.max_move,
+                      reached_goal=reached_goal,
+                      error=game_handler.error_message or "",
+                      duration_ms=duration * 1000,
+                      offense_ms=offense_bot.duration * 1000,
+                      defense_ms=defense_bot.duration * 1000)
+
+
+def _play_game(args: tuple[str, str, str, int | None]) -> GameResult:
+    return play_game(*args)
+
+
+def save_results(results: list[GameResult], path: str) -> None:
+    """Writes one array per field to a numpy .npz archive, or one row per game to a .csv file"""
+    names = [field.name for field in fields(GameResult)]
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(names)
+            writer.writerows(astuple(result) for result in results)
+        return
+
+    columns = zip(*(astuple(result) for result in results)) if results else [[] for _ in names]
+    np.savez_compressed(path, **{name: np.array(column) for name, column in zip(names, columns)})
+
+
+def print_summary(results: list[GameResult]) -> None:
+    print(f"{'offense':>14} {'defense':>8} {'games':>6} {'mean score':>11} {'goal %':>7} {'errors':>7} {'ms/game':>8}")
+    for (offense, defense), group in itertools.groupby(results, key=lambda result: (result.offense, result.defense)):
+        group = list(group)
+        print(f"{offense:>14} {defense:>8} {len(group):>6} {np.mean([result.score for result in group]):>11.1f} "
+              f"{100 * np.mean([result.reached_goal for result in group]):>7.1f} {sum(bool(result.error) for result in group):>7} "
+              f"{np.mean([result.duration_ms for result in group]):>8.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays the reference bots against each other over a range of seeds")
+    parser.add_argument("--offense", nargs="+", choices=OFFENSE_BOTS, default=OFFENSE_BOTS)
+    parser.add_argument("--defense", nargs="+", choices=DEFENSE_BOTS, default=DEFENSE_BOTS)
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--games", type=int, default=100, help="Number of seeds, every pair of bots plays each of them")
+    parser.add_argument("--max-move", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="simulation.npz",
+                        help="Results file, a .npz archive with one array per column, or a .csv file with one row per game")
+    args = parser.parse_args()
+    if not args.output.endswith((".npz", ".csv")):
+        parser.error("--output must be a .npz or .csv file")
+
+    logging.disable(logging.ERROR)
+
+    games = [(offense, defense, str(seed), args.max_move)
+             for offense, defense in itertools.product(args.offense, args.defense)
+             for seed in range(args.first_seed, args.first_seed + args.games)]
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as executor:
+            results = list(executor.map(_play_game, games, chunksize=max(1, len(games) // (args.workers * 4))))
+    else:
+        results = [_play_game(game) for game in games]
+    duration = time.perf_counter() - start
+
+    save_results(results, args.output)
+    print_summary(results)
+    print(f"{len(results)} games in {duration:.1f} s ({60 * len(results) / duration:.0f} games/min), results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
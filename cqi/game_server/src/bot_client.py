@@ -0,0 +1,411 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import asyncio
+import json
+import logging
+import struct
+import time
+from typing import Any, Callable, Iterator, Protocol
+
+import aiohttp
+
+from game_server_common import frames
+from game_server_common.base import DefenseMove, OffenseMove, Position, Transport
+from game_server_common.map import Map
+
+START_ENDPOINT = "/start"
+NEXT_ENDPOINT = "/next_move"
+END_ENDPOINT = "/end_game"
+WEBSOCKET_ENDPOINT = "/ws"
+
+# Bots are expected to accept connections quickly, the read timeout is set per request
+CONNECT_TIMEOUT = 1
+# Consecutive timeouts or connection errors after which a bot is considered down, and seconds before the first probe
+# of a down bot, up to which the delay between its probes doubles
+BREAKER_THRESHOLD = 3
+PROBE_DELAY = 5.0
+MAX_PROBE_DELAY = 60.0
+# Seconds a bot may take to answer each /next_move request, and seconds above it that it may spend over a game,
+# when the time bank is enabled
+TURN_TIME = 0.5
+TIME_BUDGET = 10.0
+TIME_BANK_EXHAUSTED = "Time bank exhausted, turn forfeited"
+
+
+class BotError(Exception):
+    """Failure to get a response from a bot, raised again when a game is replayed"""
+
+
+@dataclass
+class BotResponse:
+    status_code: int
+    text: str
+    http_error: str | None = None
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.http_error is not None:
+            raise BotError(self.http_error)
+
+    def __str__(self) -> str:
+        return f"<Response [{self.status_code}]>"
+
+
+@dataclass
+class BotExchange:
+    """Outcome of a request to a bot, either its response or the error that prevented it"""
+    response: BotResponse | None = None
+    error: str | None = None
+
+    def __iter__(self):
+        if self.response is not None:
+            yield "status", self.response.status_code
+            yield "body", self.response.text
+            if self.response.http_error is not None:
+                yield "httpError", self.response.http_error
+        else:
+            yield "error", self.error
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BotExchange":
+        if "error" in data:
+            return cls(error=data["error"])
+
+        return cls(response=BotResponse(data["status"], data["body"], data.get("httpError")))
+
+
+@dataclass(frozen=True)
+class TimeBankSettings:
+    turn_time: float = TURN_TIME
+    budget: float = TIME_BUDGET
+
+
+class TimeBank:
+    """Time a bot may spend answering the /next_move requests of a game: each answer is free up to turn_time, the time
+    above is drawn from a budget for the whole game. Once the budget is spent, the bot forfeits its turns."""
+    turn_time: float
+    remaining: float
+
+    def __init__(self, settings: TimeBankSettings = TimeBankSettings()) -> None:
+        self.turn_time = settings.turn_time
+        self.remaining = settings.budget
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.remaining <= 0
+
+    def get_timeout(self, timeout: float | None) -> float:
+        """Timeout of the next request, at most timeout"""
+        return min(self.turn_time + self.remaining, timeout if timeout is not None else float("inf"))
+
+    def spend(self, duration: float) -> None:
+        self.remaining = max(0.0, self.remaining - max(0.0, duration - self.turn_time))
+
+    def __iter__(self) -> Iterator:
+        yield "turn_time", self.turn_time
+        yield "remaining", round(self.remaining, 3)
+
+
+class BotClient(ABC):
+    """Sends the requests of a game to a bot and records every exchange, in order, so the game can be replayed"""
+    # Offered to the bot in the /start request
+    transports: list[Transport] = [Transport.HTTP]
+    # Whether the /next_move requests carry the visible tiles as a "grid" array instead of an encoded map
+    takes_grid: bool = False
+    exchanges: list[BotExchange]
+    n_requests: int
+    # Limits the time spent by the bot on /next_move requests, a forfeited turn is recorded as an error
+    time_bank: TimeBank | None
+
+    def __init__(self) -> None:
+        self.exchanges = []
+        self.n_requests = 0
+        self.time_bank = None
+
+    @property
+    def n_connections(self) -> int:
+        """Number of connections opened to the bot"""
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+    async def post(self, endpoint: str, json: dict, timeout: float | None = None) -> BotResponse:
+        self.n_requests += 1
+        try:
+            if self.time_bank is not None and endpoint == NEXT_ENDPOINT:
+                response = await self._post_with_time_bank(endpoint, json, timeout)
+            else:
+                response = await self._post(endpoint, json, timeout)
+        except Exception as e:
+            self.exchanges.append(BotExchange(error=str(e)))
+            raise
+
+        self.exchanges.append(BotExchange(response=response))
+        return response
+
+    async def _post_with_time_bank(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        if self.time_bank.is_exhausted:
+            raise BotError(TIME_BANK_EXHAUSTED)
+
+        start = time.perf_counter()
+        try:
+            return await self._post(endpoint, json, self.time_bank.get_timeout(timeout))
+        finally:
+            self.time_bank.spend(time.perf_counter() - start)
+
+    @abstractmethod
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        pass
+
+
+class CircuitBreaker:
+    """Stops calling a bot after threshold consecutive failures, its requests then fail at once. A probe request goes
+    through once probe_delay seconds have passed, in case the bot came back, and the delay doubles after each failed
+    probe, up to MAX_PROBE_DELAY. Skipped requests take no time, so the turns between two probes are played at full
+    speed and a game against a dead bot only waits for the timeouts of its probes."""
+    threshold: int
+    n_failures: int
+    first_probe_delay: float
+    probe_delay: float
+    next_probe: float
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, probe_delay: float = PROBE_DELAY) -> None:
+        self.threshold = threshold
+        self.n_failures = 0
+        self.first_probe_delay = probe_delay
+        self.probe_delay = probe_delay
+        self.next_probe = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.n_failures >= self.threshold
+
+    def allow(self) -> bool:
+        """Whether the next request should be sent to the bot"""
+        if not self.is_open:
+            return True
+
+        now = time.monotonic()
+        if now < self.next_probe:
+            return False
+
+        # A single probe at a time, the requests made while it is pending are skipped
+        self.next_probe = now + self.probe_delay
+        return True
+
+    def record_success(self) -> None:
+        self.n_failures = 0
+        self.probe_delay = self.first_probe_delay
+
+    def record_failure(self) -> None:
+        if self.is_open:
+            self.probe_delay = min(self.probe_delay * 2, MAX_PROBE_DELAY)
+        self.n_failures += 1
+        self.next_probe = time.monotonic() + self.probe_delay
+
+
+class HttpBotClient(BotClient):
+    """Keeps the connection to the bot alive for the whole game. When the bot asks for it in its /start response, the
+    next requests go through a websocket as binary frames, see game_server_common.frames, and HTTP is used again if
+    the websocket fails."""
+    transports = [Transport.HTTP, Transport.WEBSOCKET]
+    url: str
+    session: aiohttp.ClientSession | None
+    websocket: aiohttp.ClientWebSocketResponse | None
+    breaker: CircuitBreaker
+    is_offense: bool
+    _n_connections: int
+
+    def __init__(self, url: str, time_bank_settings: TimeBankSettings | None = None) -> None:
+        """Without time_bank_settings, each /next_move request only has the flat game_handler.TIMEOUT"""
+        super().__init__()
+        self.url = url
+        self.session = None
+        self.websocket = None
+        self.breaker = CircuitBreaker()
+        self.time_bank = TimeBank(time_bank_settings) if time_bank_settings is not None else None
+        self.is_offense = True
+        self._n_connections = 0
+
+    @property
+    def n_connections(self) -> int:
+        return self._n_connections
+
+    async def close(self) -> None:
+        await self._close_websocket()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session is bound to the running event loop, it is created on the first request
+        if self.session is None:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            self.session = aiohttp.ClientSession(trace_configs=[trace_config])
+        return self.session
+
+    async def _on_connection_created(self, *_) -> None:
+        self._n_connections += 1
+
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        url = self.url + endpoint
+        if not self.breaker.allow():
+            raise BotError(f"Request to {url} skipped, the bot failed to answer {self.breaker.n_failures} times in a row")
+
+        if self.websocket is not None:
+            return await self._send_frame(endpoint, json, timeout)
+
+        try:
+            async with self._get_session().post(url, json=json, timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=timeout)) as response:
+                text = await response.text()
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            raise BotError(f"Request to {url} timed out")
+        except aiohttp.ClientConnectionError:
+            self.breaker.record_failure()
+            raise
+
+        # An error status is still an answer, the bot is up
+        self.breaker.record_success()
+
+        http_error = None
+        if response.status >= 400:
+            http_error = f"{response.status} {response.reason} for url: {url}"
+
+        if endpoint == START_ENDPOINT and http_error is None:
+            self.is_offense = json["is_offense"]
+            await self._negotiate_transport(text)
+
+        return BotResponse(response.status, text, http_error)
+
+    async def _negotiate_transport(self, start_response: str) -> None:
+        try:
+            transport = json.loads(start_response).get("transport")
+        except (ValueError, AttributeError):
+            return
+
+        if transport != Transport.WEBSOCKET.value:
+            return
+
+        url = self.url + WEBSOCKET_ENDPOINT
+        try:
+            self.websocket = await asyncio.wait_for(self._get_session().ws_connect(url), CONNECT_TIMEOUT)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            logging.warning("Cannot open the websocket %s, the game goes on over HTTP: %s", url, e)
+            return
+
+        # The handler then sends the visible tiles, which the frames carry as they are
+        self.takes_grid = True
+
+    async def _close_websocket(self) -> None:
+        websocket, self.websocket = self.websocket, None
+        self.takes_grid = False
+        if websocket is not None:
+            await websocket.close()
+
+    async def _send_frame(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        url = self.url + WEBSOCKET_ENDPOINT
+        if endpoint == END_ENDPOINT:
+            try:
+                await self.websocket.send_bytes(frames.END_GAME)
+            finally:
+                await self._close_websocket()
+            return BotResponse(200, "OK")
+
+        fields = {key: value for key, value in json.items() if key != "grid"}
+        try:
+            await self.websocket.send_bytes(frames.encode_next_move(json["grid"], fields))
+            message = await asyncio.wait_for(self.websocket.receive(), timeout)
+        except (asyncio.TimeoutError, ConnectionError, aiohttp.ClientError) as e:
+            # A late answer would be taken for the one of the next turn, the websocket is dropped
+            self.breaker.record_failure()
+            await self._close_websocket()
+            raise BotError(f"Frame to {url} timed out" if isinstance(e, asyncio.TimeoutError) else f"Frame to {url} failed: {e}")
+
+        if message.type != aiohttp.WSMsgType.BINARY:
+            self.breaker.record_failure()
+            await self._close_websocket()
+            raise BotError(f"Websocket {url} closed by the bot")
+
+        self.breaker.record_success()
+        if not message.data:
+            return BotResponse(400, "Unable to play", f"400 Bad Request for url: {url}")
+
+        try:
+            if self.is_offense:
+                moves = frames.decode_offense_moves(message.data)
+                body = {"move": moves[0].value}
+                if len(moves) > 1:
+                    body["moves"] = [move.value for move in moves[1:]]
+            else:
+                move, position = frames.decode_defense_move(message.data)
+                body = {"x": position.x, "y": position.y, "element": move.value}
+        except (IndexError, ValueError, struct.error) as e:
+            raise BotError(f"Invalid frame from {url}: {e}")
+
+        return BotResponse(200, _to_body(body))
+
+
+def _to_body(data: dict) -> str:
+    # The json argument of the clients hides the json module
+    return json.dumps(data)
+
+
+class InProcessBot(Protocol):
+    def play_map(self, map: Map) -> OffenseMove | tuple[DefenseMove, Position] | None:
+        pass
+
+
+class PlanningBot(Protocol):
+    """Offense bot also giving the moves it will play next, see the "moves" field of the offense responses"""
+    def plan_map(self, map: Map, executed_moves: int) -> list[OffenseMove] | None:
+        pass
+
+
+class InProcessBotClient(BotClient):
+    """Plays a Python bot object directly, answering as the bot web server would without encoding the maps.
+    Offense bots that are also a PlanningBot queue their next moves."""
+    takes_grid = True
+    create_bot: Callable[[dict], InProcessBot]
+    bot: InProcessBot | None
+    is_offense: bool
+
+    def __init__(self, create_bot: Callable[[dict], InProcessBot]) -> None:
+        """create_bot builds the bot from the /start payload"""
+        super().__init__()
+        self.create_bot = create_bot
+        self.bot = None
+        self.is_offense = True
+
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        if endpoint == START_ENDPOINT:
+            self.is_offense = json["is_offense"]
+            self.bot = self.create_bot(json)
+            return BotResponse(200, "OK")
+
+        if endpoint != NEXT_ENDPOINT:
+            return BotResponse(200, "OK")
+
+        result = self._play(json)
+        if not result:
+            return BotResponse(400, "Unable to play", f"400 Bad Request for url: {endpoint}")
+
+        if self.is_offense:
+            moves = result if isinstance(result, list) else [result]
+            body = {"move": moves[0].value}
+            if len(moves) > 1:
+                body["moves"] = [move.value for move in moves[1:]]
+            return BotResponse(200, _to_body(body))
+
+        move, position = result
+        return BotResponse(200, _to_body({"x": position.x, "y": position.y, "element": move.value}))
+
+    def _play(self, payload: dict) -> list[OffenseMove] | OffenseMove | tuple[DefenseMove, Position] | None:
+        if self.is_offense and hasattr(self.bot, "plan_map"):
+            return self.bot.plan_map(Map(payload["grid"]), payload.get("executed_moves", 0))
+
+        return self.bot.play_map(Map(payload["grid"]))
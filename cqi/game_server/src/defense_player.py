@@ -40,11 +40,10 @@ class DefensePlayer:
         if move.element == ElementType.TIMEBOMB:
             return self.timebomb.drop(move.position, player_position)
         
-        self.map.set(move.position.x, move.position.y, move.element)
-
-        if not self.map.path_exists(player_position):
+        if self.map.is_blocking(move.position, player_position):
             self.logger.add(f"Defense move of {tile} to {move.position} causes no path from player to goal", Level.INFO)
-            self.map.set(move.position.x, move.position.y, ElementType.BACKGROUND)
+        else:
+            self.map.set(move.position.x, move.position.y, move.element)
 
         self.logger.add(f"Wall placed at: {move.position}", Level.INFO)
         self.n_walls -= 1
@@ -1,42 +1,89 @@
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from typing import Iterator
-import requests
+import asyncio
 import random
 import logging
 
-from game_server_common.base import OffenseMove
+import numpy as np
 
-from .map import Map, Position, ElementType
+from game_server_common.base import MapEncoding, OffenseMove
+from game_server_common.map import encode_grid, encode_image, render_grid
+
+from .bot_client import BotClient, BotResponse, START_ENDPOINT, NEXT_ENDPOINT, END_ENDPOINT
+from .map import Map, Position, ElementType, TILE_SIZE
 from .offense_player import OffensePlayer
 from .defense_player import DefensePlayer, DefenseMove
 from .logger import GameStep, Level, Logger
+from .metrics import PROCESS_METRICS, Phase, TurnMetrics
 from .timebomb import Timebomb
 
-START_ENDPOINT = "/start"
-NEXT_ENDPOINT = "/next_move"
-END_ENDPOINT = "/end_game"
-
 N_WALLS = 30
+# Read timeout of the bot requests, the connect timeout is bot_client.CONNECT_TIMEOUT. The /next_move requests are
+# also limited by the time bank of the bot, see bot_client.TimeBank
 TIMEOUT = 2
 MIN_MAP_SIZE = 20
 MAX_MAP_SIZE = 40
 
 N_FULL_VISION = 3
+# Moves an offense bot may queue after the one it plays, see GameHandler._play_offense
+MAX_QUEUED_MOVES = 10
+
+@dataclass
+class BotOptions:
+    """Settings requested by a bot in its /start response"""
+    map_encoding: MapEncoding = MapEncoding.PNG
+    tile_size: int = TILE_SIZE
+
+    @classmethod
+    def from_response(cls, response: BotResponse) -> "BotOptions":
+        try:
+            data = response.json()
+        except ValueError:
+            return cls()
+
+        if not isinstance(data, dict):
+            return cls()
+
+        try:
+            map_encoding = MapEncoding(data.get("map_encoding", MapEncoding.PNG.value))
+        except ValueError:
+            map_encoding = MapEncoding.PNG
+
+        tile_size = data.get("tile_size", TILE_SIZE)
+        if type(tile_size) is not int or not 1 <= tile_size <= TILE_SIZE:
+            tile_size = TILE_SIZE
+
+        return cls(map_encoding=map_encoding, tile_size=tile_size)
+
+def encode_map_payload(grid: np.ndarray, options: BotOptions) -> dict:
+    """Body of a /next_move request showing grid, a module function so it can run in a worker process"""
+    if options.map_encoding == MapEncoding.GRID:
+        return {"map": encode_grid(grid).decode(), "encoding": MapEncoding.GRID.value, "shape": list(grid.shape)}
+
+    return {"map": encode_image(render_grid(grid, options.tile_size)).decode()}
 
 @dataclass
 class GameData:
-    steps: list[GameStep]
+    logger: Logger
     error_message: str | None
     max_move_count: int
+    timings: TurnMetrics
+
+    @property
+    def steps(self) -> Iterator[GameStep]:
+        """Rebuilt from the logger on each read, a finished game only keeps the deltas of its maps"""
+        return self.logger.iter_steps()
 
     def __iter__(self) -> Iterator:
         yield "steps", [dict(step) for step in self.steps]
         yield "errorMessage", self.error_message
         yield "maxMoveCount", self.max_move_count
+        yield "timings", dict(self.timings)
 
 class GameHandler:
-    offense_bot_url: str
-    defense_bot_url: str
+    offense_bot: BotClient
+    defense_bot: BotClient
 
     map: Map
     max_move: int
@@ -49,12 +96,29 @@ class GameHandler:
     defense_player: DefensePlayer | None
     timebomb: Timebomb
 
+    offense_options: BotOptions
+    defense_options: BotOptions
 
-    def __init__(self, offense_bot_url: str, defense_bot_url: str, max_move: int | None) -> None:
-        self.offense_bot_url = offense_bot_url
-        self.defense_bot_url = defense_bot_url
+    executor: Executor | None
+    metrics: TurnMetrics
 
-        self.map = Map.create_map(random.randint(MIN_MAP_SIZE, MAX_MAP_SIZE), random.randint(MIN_MAP_SIZE, MAX_MAP_SIZE))
+    # Moves queued by the offense bot in its last response, played without calling it while the map stays the same
+    offense_queue: list[OffenseMove]
+    # What the offense player saw after its last move
+    _queue_view: np.ndarray | None
+    # Queued moves played since the last call to the offense bot, None if its last response had no queue
+    _executed_moves: int | None
+
+
+    def __init__(self, offense_bot: BotClient, defense_bot: BotClient, max_move: int | None, rng: random.Random,
+                 executor: Executor | None = None, metrics: TurnMetrics | None = None) -> None:
+        """rng draws the map and the positions, executor encodes the maps sent to the bots if given.
+        metrics times the turns, by default it also reports them to the /metrics of the process."""
+        self.offense_bot = offense_bot
+        self.defense_bot = defense_bot
+        self.executor = executor
+
+        self.map = Map.create_map(rng, rng.randint(MIN_MAP_SIZE, MAX_MAP_SIZE), rng.randint(MIN_MAP_SIZE, MAX_MAP_SIZE))
         self.max_move = max_move or (self.map.width + self.map.height) * 4
         self.move_count = 0
 
@@ -68,6 +132,15 @@ class GameHandler:
         self.defense_player = None
         self.timebomb = Timebomb(self.map, self.logger)
 
+        self.offense_options = BotOptions()
+        self.defense_options = BotOptions()
+
+        self.metrics = metrics if metrics is not None else TurnMetrics(PROCESS_METRICS)
+
+        self.offense_queue = []
+        self._queue_view = None
+        self._executed_moves = None
+
    
     @property
     def available_moves(self) -> int:
@@ -78,8 +151,9 @@ class GameHandler:
         if self.offense_player is None:
             return None
 
-        shortest_path = self.map.get_shortest_path(self.offense_player.position)
-        return self.max_move - len(shortest_path) + (self.max_move - self.move_count)
+        distance = self.map.get_goal_distance(self.offense_player.position)
+        path_length = distance + 1 if distance is not None else len(self.map.get_shortest_path(self.offense_player.position))
+        return self.max_move - path_length + (self.max_move - self.move_count)
 
     @property
     def is_started(self) -> bool:
@@ -87,32 +161,44 @@ class GameHandler:
 
     @property
     def is_over(self) -> bool:
+        if self.error_message is not None:
+            return True
+
         if self.offense_player is None:
             return False
 
-        if self.available_moves <= 0 or self.error_message is not None:
+        if self.available_moves <= 0:
             return True
 
         return self.map.goal == self.offense_player.position
 
-    def play(self):
+    async def play(self):
         self.logger.add(f"Remaining number of moves: {self.available_moves}", Level.DEBUG)
 
-        self.timebomb.play()
-        self._play_defense()
-        self._play_offense()
-
-        self.move_count += 1
-        self.logger.add_step(self.map.to_list(), self.score, self.offense_player.get_vision_radius())
-
-    def end_game(self):
-        try:
-            requests.post(self.offense_bot_url + END_ENDPOINT, {})
-            requests.post(self.defense_bot_url + END_ENDPOINT, {})
-        except Exception as e:
-            logging.error("Error ending game: %s", e)
-
-    def start_game(self):
+        with self.metrics.time(Phase.TURN):
+            self.timebomb.play()
+            await self._play_defense()
+            await self._play_offense()
+
+            self.move_count += 1
+            with self.metrics.time(Phase.SCORE):
+                score = self.score
+            self.logger.add_step(self.map.map, score, self.offense_player.get_vision_radius())
+
+    async def end_game(self):
+        results = await asyncio.gather(self.offense_bot.post(END_ENDPOINT, {}), self.defense_bot.post(END_ENDPOINT, {}),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error("Error ending game: %s", result)
+
+    async def close(self):
+        """Closes the connections to the bots, logging how many requests each connection served"""
+        for role, bot in [("Offense", self.offense_bot), ("Defense", self.defense_bot)]:
+            logging.info("%s bot: %d requests over %d connections", role, bot.n_requests, bot.n_connections)
+            await bot.close()
+
+    async def start_game(self):
         self.offense_player = OffensePlayer(self.map, self.logger)
         self.defense_player = DefensePlayer(self.map, self.timebomb, self.logger, n_walls=N_WALLS)
 
@@ -129,26 +215,53 @@ class GameHandler:
                 "timebomb_second_round": ElementType.TIMEBOMB_SECOND_ROUND.to_color(), 
                 "timebomb_third_round": ElementType.TIMEBOMB_THIRD_ROUND.to_color()
             }
-
-            result = requests.post(self.offense_bot_url + START_ENDPOINT,
-                                   json={"is_offense": True, "max_moves": self.max_move, "element_types_color": element_types_color}, timeout=TIMEOUT)
-            result.raise_for_status()
-
-            result = requests.post(self.defense_bot_url + START_ENDPOINT,
-                                   json={"is_offense": False, "n_walls": N_WALLS, "element_types_color": element_types_color}, timeout=TIMEOUT)
-            result.raise_for_status()
+            map_encodings = [encoding.value for encoding in MapEncoding]
+
+            # Both bots are started at once, the offense error is reported first when both fail
+            results = await asyncio.gather(
+                self.offense_bot.post(START_ENDPOINT,
+                                      json={"is_offense": True, "max_moves": self.max_move, "element_types_color": element_types_color, "map_encodings": map_encodings,
+                                            "transports": [transport.value for transport in self.offense_bot.transports]}, timeout=TIMEOUT),
+                self.defense_bot.post(START_ENDPOINT,
+                                      json={"is_offense": False, "n_walls": N_WALLS, "element_types_color": element_types_color, "map_encodings": map_encodings,
+                                            "transports": [transport.value for transport in self.defense_bot.transports]}, timeout=TIMEOUT),
+                return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+                result.raise_for_status()
+
+            offense_result, defense_result = results
+            self.offense_options = BotOptions.from_response(offense_result)
+            self.defense_options = BotOptions.from_response(defense_result)
         except Exception as e:
             logging.error("Error starting game: %s", e)
             self.error_message = f"Failed to start game with exception:\n{str(e)}"
             return
         
-        self.logger.add_step(self.map.to_list(), self.score, self.offense_player.get_vision_radius())
+        self.logger.add_step(self.map.map, self.score, self.offense_player.get_vision_radius())
 
 
-    def _play_defense(self):
+    async def _get_map_payload(self, bot: BotClient, options: BotOptions, visibility_range: int | None = None) -> dict:
+        grid = self.map.get_visible_grid(self.offense_player.position, visibility_range)
+        if bot.takes_grid:
+            # A copy, so that the bot cannot change the game map
+            payload = {"grid": grid.copy()}
+        elif self.executor is None:
+            payload = encode_map_payload(grid, options)
+        else:
+            payload = await asyncio.get_running_loop().run_in_executor(self.executor, encode_map_payload, grid, options)
+
+        if bot.time_bank is not None:
+            payload["time_bank"] = dict(bot.time_bank)
+        return payload
+
+    async def _play_defense(self):
         try:
-            response: requests.Response = requests.post(self.defense_bot_url + NEXT_ENDPOINT, json={
-                                                    "map": self.map.to_img_64(self.offense_player.position).decode()}, timeout=TIMEOUT)
+            with self.metrics.time(Phase.DEFENSE_RENDER):
+                payload = await self._get_map_payload(self.defense_bot, self.defense_options)
+            with self.metrics.time(Phase.DEFENSE_BOT):
+                response = await self.defense_bot.post(NEXT_ENDPOINT, json=payload, timeout=TIMEOUT)
         except Exception as e:
             self.logger.add(f"Error getting response from defense bot: {e}", Level.ERROR)
             return
@@ -179,19 +292,36 @@ class GameHandler:
             self.logger.add(f"Error parsing response from defense bot: {e}\n{response}", Level.ERROR)
             return
 
-        self.defense_player.move(move, self.offense_player.position)
+        with self.metrics.time(Phase.DEFENSE_VALIDATION):
+            self.defense_player.move(move, self.offense_player.position)
 
-    def _play_offense(self):
+    async def _play_offense(self):
         if self.timebomb.skip_offense:
             self.logger.add("Offense move was skipped, timebomb still active", Level.INFO)
             return
 
+        # A change in sight of the player, from the defense or a timebomb, or a vision bonus calls the bot again
+        if self.offense_queue and not self.offense_player.is_large_vision and \
+                np.array_equal(self.map.get_visible_grid(self.offense_player.position, self.offense_player.get_vision_radius()), self._queue_view):
+            self.logger.add("Offense move played from the queue of the bot", Level.INFO)
+            # A failed move clears the queue, the bot only counts the moves that were played
+            if self._move_offense(self.offense_queue.pop(0)):
+                self._executed_moves += 1
+            return
+
+        self.offense_queue = []
         try:
-            response = requests.post(self.offense_bot_url + NEXT_ENDPOINT, json={
-                                    "map": self.map.to_img_64(self.offense_player.position, self.offense_player.get_and_remove_vision_radius()).decode()}, timeout=TIMEOUT)
+            with self.metrics.time(Phase.OFFENSE_RENDER):
+                payload = await self._get_map_payload(self.offense_bot, self.offense_options, self.offense_player.get_and_remove_vision_radius())
+            if self._executed_moves is not None:
+                payload["executed_moves"] = self._executed_moves
+            with self.metrics.time(Phase.OFFENSE_BOT):
+                response = await self.offense_bot.post(NEXT_ENDPOINT, json=payload, timeout=TIMEOUT)
         except Exception as e:
             self.logger.add(f"Error getting response from offense bot: {e}", Level.ERROR)
             return
+        finally:
+            self._executed_moves = None
 
         move: OffenseMove | None = None
         try:
@@ -201,18 +331,38 @@ class GameHandler:
             self.logger.add(f"Error parsing response from offense bot: {e}\n{response}", Level.ERROR)
             return
 
+        try:
+            queue = [OffenseMove(queued_move) for queued_move in data.get("moves", [])[:MAX_QUEUED_MOVES]]
+        except Exception as e:
+            self.logger.add(f"Error parsing the queued moves of the offense bot, they are ignored: {e}", Level.ERROR)
+            queue = []
+
         if move is None:
             self.logger.add("Offense move was skipped", Level.INFO)
             return
 
+        self.offense_queue = queue
+        self._executed_moves = 0 if queue else None
+        self._move_offense(move)
+
+    def _move_offense(self, move: OffenseMove) -> bool:
+        """Whether the move was played, a skip or a move to another tile"""
         if self.available_moves <= 0:
             self.logger.add("No more move available", Level.INFO)
-            return
+            return False
 
+        position = self.offense_player.position
         self.offense_player.move(move)
+        is_played = move == OffenseMove.SKIP or self.offense_player.position != position
+        # The queue was planned from a position the player did not reach
+        if not is_played:
+            self.offense_queue = []
+        self._queue_view = self.map.get_visible_grid(self.offense_player.position, self.offense_player.get_vision_radius()).copy()
+        return is_played
 
     def get_data(self) -> GameData:
         return GameData(
-            steps=self.logger.get(),
+            logger=self.logger,
             error_message=self.error_message,
-            max_move_count=self.max_move)
+            max_move_count=self.max_move,
+            timings=self.metrics)
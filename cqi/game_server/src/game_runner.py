@@ -1,9 +1,39 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import cached_property
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
 import random
-from threading import RLock
-import time
+import uuid
+from typing import AsyncIterator
 
+from src.bot_client import HttpBotClient, TimeBankSettings
 from src.game_handler import GameHandler, GameData
+from src.logger import GameStep
+from src.map import Position
+from src.replay import GameReplay
+
+
+class SerializedStatus:
+    """JSON body of a status, serialized once and compressed on first use, with the ETag identifying it"""
+    body: bytes
+    etag: str
+    _gzip_body: bytes | None
+
+    def __init__(self, data: dict) -> None:
+        self.body = json.dumps(data).encode()
+        self.etag = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self) -> bytes:
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body)
+        return self._gzip_body
 
 
 @dataclass
@@ -12,26 +42,84 @@ class GameServerStatus:
     is_over: bool
     score: float
     game_data: GameData | None
+    blocking_cells: list[Position] | None = None
+    replay: GameReplay | None = None
 
     def __iter__(self):
         yield "isRunning", self.is_running
         yield "isOver", self.is_over
         yield "score", self.score
         yield "gameData", dict(self.game_data) if self.game_data is not None else None
+        # Debug only, tiles where walls and timebombs are rejected for cutting the player from the goal
+        if self.blocking_cells is not None:
+            yield "blockingCells", [list(cell) for cell in self.blocking_cells]
+
+    def to_replay_dict(self) -> dict:
+        """Status where the game data holds the inputs of the game instead of every step, see replay_game"""
+        status = {"isRunning": self.is_running, "isOver": self.is_over, "score": self.score, "gameData": None}
+        if self.game_data is not None:
+            status["gameData"] = {
+                "replay": dict(self.replay),
+                "errorMessage": self.game_data.error_message,
+                "maxMoveCount": self.game_data.max_move_count
+            }
+        return status
+
+    # A status is replaced rather than modified when the game changes, so its bodies are serialized once
+    @cached_property
+    def serialized(self) -> SerializedStatus:
+        return SerializedStatus(dict(self))
+
+    @cached_property
+    def serialized_replay(self) -> SerializedStatus:
+        return SerializedStatus(self.to_replay_dict())
+
+# Games running at once in a server, and finished games whose status is kept
+MAX_GAMES = 32
+FINISHED_GAMES_KEPT = 64
+# Events waiting to be sent to a stream client, a client further behind is disconnected and resumes from its last event id
+STREAM_BUFFER = 64
+
+
+def to_event(event: str, data: dict, id: int | None = None) -> bytes:
+    """Server-sent event, json.dumps keeps the data on a single line"""
+    id_line = f"id: {id}\n" if id is not None else ""
+    return f"{id_line}event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def _to_step_event(index: int, step: GameStep) -> bytes:
+    return to_event("step", {"index": index, **dict(step)}, index)
+
+
+def _to_end_event(game_handler: GameHandler) -> bytes:
+    return to_event("end", {"isOver": game_handler.is_over, "score": game_handler.score, "errorMessage": game_handler.error_message})
+
 
 class Runner:
-    game_lock: RLock
-    data_lock: RLock
-    should_stop: bool
+    """Plays the launched game as a task of the running event loop"""
+    is_debug: bool
+    executor: Executor | None
+    time_bank_settings: TimeBankSettings | None
     game_status: GameServerStatus
 
     game_handler: GameHandler | None
+    game_replay: GameReplay | None
+    game_task: asyncio.Task | None
+
+    # Events of the game for each /stream client, None closes the stream
+    streams: list[asyncio.Queue[bytes | None]]
+    _n_streamed_steps: int
 
-    def __init__(self) -> None:
-        self.game_lock = RLock()
-        self.data_lock = RLock()
-        self.should_stop = False
+    def __init__(self, is_debug: bool = False, executor: Executor | None = None,
+                 time_bank_settings: TimeBankSettings | None = None) -> None:
+        self.is_debug = is_debug
+        self.executor = executor
+        self.time_bank_settings = time_bank_settings
         self.game_handler = None
+        self.game_replay = None
+        self.game_task = None
+        self.streams = []
+        self._n_streamed_steps = 0
 
         self._update_status()
 
@@ -45,61 +133,182 @@ class Runner:
 
     @property
     def is_running(self) -> bool:
-        with self.game_lock:
-            return self.is_active and not self.is_over
+        return self.is_active and not self.is_over
 
-    def run(self):
-        while not self.should_stop:
-            if not self.is_running:
-                time.sleep(1)
-            with self.game_lock:
-                self._handle_game()
-        self.force_end_game()
-
-    def stop(self):
-        self.should_stop = True
+    async def stop(self):
+        await self.force_end_game()
 
     def launch_game(self, offense_bot_url: str, defense_bot_url: str, seed: str, max_move: int | None = None) -> None:
+        """Starts a game, which is played while the event loop runs, unless one is already active"""
         if self.is_active:
             return
 
-        with self.game_lock:
-            if self.is_active:
-                return
-            random.seed(seed)
-            self.game_handler = GameHandler(offense_bot_url, defense_bot_url, max_move)
+        offense_bot = HttpBotClient(offense_bot_url, self.time_bank_settings)
+        defense_bot = HttpBotClient(defense_bot_url, self.time_bank_settings)
+        self.game_handler = GameHandler(offense_bot, defense_bot, max_move, random.Random(seed), self.executor)
+        self.game_replay = GameReplay(seed, max_move, offense_bot.exchanges, defense_bot.exchanges)
+        self.game_task = asyncio.create_task(self._play_game(self.game_handler))
         self._update_status()
 
-    def force_end_game(self) -> bool:
+    async def force_end_game(self) -> bool:
         if not self.is_active:
             return False
 
-        with self.game_lock:
-            if not self.is_active:
-                return False
+        game_handler, game_task = self.game_handler, self.game_task
+        self.game_handler = None
+        self.game_replay = None
+        self.game_task = None
+        self._update_status()
 
-            self.game_handler.end_game()
-            self.game_handler = None
-            self._update_status()
+        game_task.cancel()
+        self._end_streams(game_handler)
+        await game_handler.end_game()
+        await game_handler.close()
+        return True
 
     def status(self) -> GameServerStatus:
         return self.game_status
 
-    def _handle_game(self) -> None:
+    async def stream(self, start: int = 0) -> AsyncIterator[bytes]:
+        """Server-sent events of the game: a step event for each step from start, sent as soon as it is played,
+        then an end event. The stream stops without the end event when the client falls STREAM_BUFFER events behind."""
+        game_handler = self.game_handler
+        if game_handler is None:
+            return
+
         if not self.is_running:
-            self._update_status()
+            for index, step in enumerate(game_handler.logger.iter_steps(start), start):
+                yield _to_step_event(index, step)
+            yield _to_end_event(game_handler)
             return
 
-        if not self.game_handler.is_started:
-            self.game_handler.start_game()
-        
-        if self.is_running:
-            self.game_handler.play()
-        self._update_status()
+        # Steps played from now on are queued, the ones already played are rebuilt from the logger
+        queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.streams.append(queue)
+        try:
+            start = min(start, self._n_streamed_steps)
+            for index, step in enumerate(game_handler.logger.iter_steps(start, self._n_streamed_steps), start):
+                yield _to_step_event(index, step)
+
+            while (event := await queue.get()) is not None:
+                yield event
+        finally:
+            if queue in self.streams:
+                self.streams.remove(queue)
+
+    async def _play_game(self, game_handler: GameHandler) -> None:
+        try:
+            await game_handler.start_game()
+            self._publish_steps()
+            while not game_handler.is_over:
+                await game_handler.play()
+                self._update_status()
+                self._publish_steps()
+        except Exception as e:
+            # The game ends with the error instead of staying in the running state
+            logging.exception("Error playing game")
+            game_handler.error_message = f"Game stopped by an unexpected error:\n{str(e)}"
+        finally:
+            # force_end_game closes a game it cancels and ends its streams itself
+            if self.game_handler is game_handler:
+                await game_handler.close()
+                self._update_status()
+                self._end_streams(game_handler)
+
+    def _publish_steps(self) -> None:
+        """Queues the new steps of the game for the streams, each serialized once"""
+        logger = self.game_handler.logger
+        start, self._n_streamed_steps = self._n_streamed_steps, logger.n_steps
+        if not self.streams:
+            return
+
+        for index, step in enumerate(logger.iter_steps(start), start):
+            event = _to_step_event(index, step)
+            for queue in list(self.streams):
+                if queue.qsize() >= STREAM_BUFFER:
+                    self.streams.remove(queue)
+                    queue.put_nowait(None)
+                else:
+                    queue.put_nowait(event)
+
+    def _end_streams(self, game_handler: GameHandler) -> None:
+        event = _to_end_event(game_handler)
+        for queue in self.streams:
+            queue.put_nowait(event)
+            queue.put_nowait(None)
+        self.streams = []
 
     def _update_status(self) -> None:
+        blocking_cells = None
+        if self.is_debug and self.is_active and self.game_handler.is_started:
+            blocking_cells = sorted(self.game_handler.map.get_blocking_cells(self.game_handler.offense_player.position) or [],
+                                    key=lambda cell: (cell.x, cell.y))
+
         game_status = GameServerStatus(self.is_running,
                                         self.is_over,
                                         self.game_handler.score if self.is_active else 0,
-                                        self.game_handler.get_data() if self.is_over else None)
+                                        self.game_handler.get_data() if self.is_over else None,
+                                        blocking_cells,
+                                        self.game_replay if self.is_over else None)
         self.game_status = game_status
+
+
+IDLE_STATUS = GameServerStatus(False, False, 0, None)
+
+class GameManager:
+    """Hosts the games of the server, each played by its own Runner and known by its id"""
+    is_debug: bool
+    max_games: int
+    time_bank_settings: TimeBankSettings | None
+    executor: Executor | None
+    runners: OrderedDict[str, Runner]
+
+    def __init__(self, is_debug: bool = False, max_games: int = MAX_GAMES, workers: int = 0,
+                 time_bank_settings: TimeBankSettings | None = None) -> None:
+        """With workers, the maps sent to the bots are encoded by a pool of that many processes. Without
+        time_bank_settings, the bots have no time bank."""
+        self.is_debug = is_debug
+        self.max_games = max_games
+        self.time_bank_settings = time_bank_settings
+        self.executor = ProcessPoolExecutor(workers) if workers > 0 else None
+        self.runners = OrderedDict()
+
+    def get(self, game_id: str | None = None) -> Runner | None:
+        """Runner of the game, the last launched one if game_id is None"""
+        if game_id is None:
+            return next(reversed(self.runners.values()), None)
+
+        return self.runners.get(game_id)
+
+    def status(self, game_id: str | None = None) -> GameServerStatus | None:
+        runner = self.get(game_id)
+        if runner is None:
+            return IDLE_STATUS if game_id is None else None
+
+        return runner.status()
+
+    def launch_game(self, offense_bot_url: str, defense_bot_url: str, seed: str, max_move: int | None = None) -> str | None:
+        """Starts a game and returns its id, None if max_games games are already running"""
+        if sum(runner.is_running for runner in self.runners.values()) >= self.max_games:
+            return None
+
+        self._forget_finished_games()
+        game_id = uuid.uuid4().hex
+        runner = Runner(self.is_debug, self.executor, self.time_bank_settings)
+        runner.launch_game(offense_bot_url, defense_bot_url, seed, max_move)
+        self.runners[game_id] = runner
+        return game_id
+
+    async def force_end_game(self, game_id: str | None = None) -> bool:
+        runner = self.get(game_id)
+        return runner is not None and await runner.force_end_game()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(runner.stop() for runner in self.runners.values()))
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _forget_finished_games(self) -> None:
+        finished = [game_id for game_id, runner in self.runners.items() if not runner.is_running]
+        for game_id in finished[:max(0, len(finished) - FINISHED_GAMES_KEPT + 1)]:
+            del self.runners[game_id]
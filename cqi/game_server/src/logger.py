@@ -1,8 +1,12 @@
+from array import array
 from dataclasses import dataclass
 from enum import Enum
+import itertools
 import logging
 from typing import Iterator
 
+import numpy as np
+
 class Level(Enum):
     DEBUG = logging.DEBUG
     INFO = logging.INFO
@@ -22,16 +26,59 @@ class GameStep:
         yield "score", self.score
         yield "visionRadius", self.visionRadius
 
+def _to_lists(frame: np.ndarray) -> list[list[str]]:
+    return [[str(value) for value in column] for column in frame.tolist()]
+
 class Logger:
+    """Keeps the logs of every step and their maps as the first map (keyframe) followed by the cells changed at each step"""
     _history: list[GameStep]
     _current_step: GameStep
 
+    _keyframe: np.ndarray | None
+    _last_frame: np.ndarray | None
+    _delta_indices: array
+    _delta_values: array
+    _delta_ends: array
+
     def __init__(self):
         self._history = []
         self._current_step = GameStep([], [], 0, 0)
+
+        self._keyframe = None
+        self._last_frame = None
+        self._delta_indices = array("i")
+        self._delta_values = array("b")
+        self._delta_ends = array("i")
     
     def get(self) -> list[GameStep]:
-        return self._history.copy()
+        """Steps with their full maps, rebuilt from the deltas on each call so that only the deltas are kept"""
+        return list(self.iter_steps())
+
+    @property
+    def n_steps(self) -> int:
+        return len(self._history)
+
+    def iter_steps(self, start: int = 0, stop: int | None = None) -> Iterator[GameStep]:
+        """Steps from start to stop (excluded) with their full maps, rebuilt one at a time without keeping them"""
+        stop = self.n_steps if stop is None else min(stop, self.n_steps)
+        # The last frame is kept, it is the common case of a step sent as soon as it is played
+        frames = iter([self._last_frame]) if start == self.n_steps - 1 else itertools.islice(self._iter_frames(), start, stop)
+        return (GameStep(_to_lists(frame), step.logs, step.score, step.visionRadius) for step, frame in zip(self._history[start:stop], frames))
+
+    def _iter_frames(self) -> Iterator[np.ndarray]:
+        if self._keyframe is None:
+            return
+
+        frame = self._keyframe.copy()
+        flat_frame = frame.reshape(-1)
+        # Copies, the arrays keep growing while the frames are consumed
+        indices = np.array(self._delta_indices)
+        values = np.array(self._delta_values)
+        start = 0
+        for end in self._delta_ends.tolist():
+            flat_frame[indices[start:end]] = values[start:end]
+            start = end
+            yield frame
 
     def add(self, message: str, level: Level):
         logging.log(level.value, message)
@@ -39,9 +86,17 @@ class Logger:
         if level.value >= Level.INFO.value: 
             self._current_step.logs.append(f"{level.name}: {message}")
 
-    def add_step(self, map: list[list[str]], score: int, visionRadius: int):
+    def add_step(self, map: np.ndarray, score: int, visionRadius: int):
         logging.info(f"Round {len(self._history)}, Score: {score}" if len(self._history) > 0 else "Game started")
-        self._current_step.map = map
+        if self._keyframe is None:
+            self._keyframe = map.copy()
+        else:
+            changed = np.flatnonzero(map != self._last_frame)
+            self._delta_indices.extend(changed.tolist())
+            self._delta_values.extend(map.reshape(-1)[changed].tolist())
+        self._delta_ends.append(len(self._delta_indices))
+        self._last_frame = map.copy()
+
         self._current_step.score = score
         self._current_step.visionRadius = visionRadius
         self._history.append(self._current_step)
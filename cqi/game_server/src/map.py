@@ -1,34 +1,47 @@
 #!/bin/env python3
 
 from game_server_common.base import *
-from game_server_common.map import Map as CommonMap, Tile
+from game_server_common import pathfinding
+from game_server_common.map import Map as CommonMap, Tile, TILE_SIZE, encode_grid, encode_image, render_grid
 
-from PIL import Image
-from io import BytesIO
 import logging
 
 import random
 import numpy as np
-import base64
 
-TILE_SIZE = 20
+# The offense player never blocks its own path, keeping it passable means its moves do not invalidate the goal distances
+GOAL_DISTANCE_ELEMENTS = pathfinding.PASSABLE_ELEMENTS | {ElementType.PLAYER_OFFENSE}
 
 class Map(CommonMap):
     width: int
     height: int
 
     goal: Position
+    rng: random.Random
+    _goal_distances: list[int] | None
 
-    def __init__(self, map: np.ndarray) -> None:
+    def __init__(self, map: np.ndarray, rng: random.Random) -> None:
+        """rng places the goal and the large vision tiles, each game has its own"""
         super().__init__(map)
+        self.rng = rng
         self.width = map.shape[0]
         self.height = map.shape[1]
+        self._goal_distances = None
 
         self._set_goal()
 
     def _set_goal(self) -> None:
-        self.goal = Position(self.width - 1, random.randint(0, self.height - 1)) 
-        self.map[self.goal.x, self.goal.y] = ElementType.GOAL.value
+        self.goal = Position(self.width - 1, self.rng.randint(0, self.height - 1)) 
+        self.set(self.goal.x, self.goal.y, ElementType.GOAL)
+
+    def set(self, x: int, y: int, element_type: ElementType) -> bool:
+        previous = self.get(x, y)
+        if not super().set(x, y, element_type):
+            return False
+
+        if (previous.element in GOAL_DISTANCE_ELEMENTS) != (element_type in GOAL_DISTANCE_ELEMENTS):
+            self._goal_distances = None
+        return True
 
     def __str__(self) -> str:
         return str(self.map)
@@ -51,90 +64,100 @@ class Map(CommonMap):
     def to_list(self) -> list[list[str]]:
         return [[str(row) for row in col] for col in self.map.tolist()]
     
-    def to_img_64(self, offense_position: Position, visibility_range: int = None) -> bytes:
-        """Creates a base64 image of the map"""
-        image = Image.new("RGB", (self.width * TILE_SIZE, self.height * TILE_SIZE), color = ElementType.BACKGROUND.to_color())
-
-        def img_paste(x :int, y: int, type: ElementType):
-            image.paste(type.to_color(), (x * TILE_SIZE, y * TILE_SIZE, (x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE))
-        
-        for x in range(self.width):
-            for y in range(self.height):
-                element_type = ElementType(self.map[x, y])
-                if element_type is not ElementType.BACKGROUND:
-                    img_paste(x, y, element_type)
-
-        if visibility_range is not None:
-            left = max(0, offense_position.x - visibility_range)
-            right = min(self.width, offense_position.x + visibility_range + 1)
-            upper = max(0, offense_position.y - visibility_range)
-            lower = min(self.height, offense_position.y + visibility_range + 1)
-            image = image.crop(tuple([value * TILE_SIZE for value in [left, upper, right, lower]]))
-
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue())
+    def _get_visible_window(self, offense_position: Position, visibility_range: int | None) -> tuple[int, int, int, int]:
+        if visibility_range is None:
+            return 0, 0, self.width, self.height
+
+        left = max(0, offense_position.x - visibility_range)
+        right = min(self.width, offense_position.x + visibility_range + 1)
+        upper = max(0, offense_position.y - visibility_range)
+        lower = min(self.height, offense_position.y + visibility_range + 1)
+        return left, upper, right, lower
+
+    def get_visible_grid(self, offense_position: Position, visibility_range: int = None) -> np.ndarray:
+        """View of the part of the map seen by the offense player, the whole map if visibility_range is None"""
+        left, upper, right, lower = self._get_visible_window(offense_position, visibility_range)
+        return self.map[left:right, upper:lower]
+
+    def to_img_64(self, offense_position: Position, visibility_range: int = None, tile_size: int = TILE_SIZE) -> bytes:
+        """Creates a base64 image of the visible part of the map"""
+        return encode_image(render_grid(self.get_visible_grid(offense_position, visibility_range), tile_size))
+
+    def to_grid_64(self, offense_position: Position, visibility_range: int = None) -> tuple[bytes, tuple[int, int]]:
+        """Creates a base64 int8 buffer of the visible part of the map, along with its shape"""
+        grid = self.get_visible_grid(offense_position, visibility_range)
+        return encode_grid(grid), grid.shape
 
     def set_full_vision(self):
-        large_vision: Position = Position(random.randint(0, self.width - 1), random.randint(0, self.height - 1))
+        large_vision: Position = Position(self.rng.randint(0, self.width - 1), self.rng.randint(0, self.height - 1))
 
         if self.get(large_vision.x, large_vision.y).element != ElementType.BACKGROUND:
             self.set_full_vision()
             return
 
-        self.map[large_vision.x, large_vision.y] = ElementType.LARGE_VISION.value
+        self.set(large_vision.x, large_vision.y, ElementType.LARGE_VISION)
 
     def get_shortest_path(self, start: Position) -> list[Position]:
-        path_map = self.map.copy()
-        end = self.goal
-
-        queue: list[list[Position]] = []
-        queue.append([start])
-        path_map[start.x, start.y] = ElementType.VISITED.value
-
-        while(len(queue) > 0):
-            path: list[Position] = queue.pop(0)
-            point = path[-1]
-
-            if point.x == end.x and point.y == end.y:
-                break
-
-            # Check other points
-            next_points = [Position(point.x + 1, point.y), Position(point.x - 1, point.y), Position(point.x, point.y + 1), Position(point.x, point.y - 1)]
-            for next_point in next_points:
-                if next_point.x >= 0 and next_point.x < path_map.shape[0] and next_point.y >= 0 and next_point.y < path_map.shape[1]:
-                    if path_map[next_point.x, next_point.y] in [ElementType.BACKGROUND.value, ElementType.GOAL.value, ElementType.LARGE_VISION.value]:
-                        path_map[next_point.x, next_point.y] = ElementType.VISITED.value
-                        queue.append(path + [next_point])
-            
-        return path
+        return pathfinding.shortest_path(self.map, start, self.goal, fallback_to_last=True)
 
-    def path_exists(self, start: Position) -> bool:
-        path_map = self.map.copy()
-        end = self.goal
+    def _get_goal_distances(self) -> list[int]:
+        if self._goal_distances is None:
+            self._goal_distances = pathfinding.distance_field(self.map, self.goal, GOAL_DISTANCE_ELEMENTS)
 
-        queue = []
-        queue.append(start)
-        path_map[start.x, start.y] = ElementType.VISITED.value
+        return self._goal_distances
 
-        valid_path = False
-        while(len(queue) > 0):
-            point: Position = queue.pop(0)
+    def get_goal_distance(self, start: Position) -> int | None:
+        """Number of moves from start to the goal, None if there is no path. Distances are computed once
+        from the goal and kept until a tile is blocked or freed."""
+        goal_distances = self._get_goal_distances()
 
-            if point.x == end.x and point.y == end.y:
-                valid_path = True
-                break
+        if self.get(start.x, start.y).element in GOAL_DISTANCE_ELEMENTS:
+            distance = goal_distances[start.x * self.height + start.y]
+            return distance if distance >= 0 else None
 
-            # Check other points
-            next_points = [Position(point.x + 1, point.y), Position(point.x - 1, point.y), Position(point.x, point.y + 1), Position(point.x, point.y - 1)]
-            for next_point in next_points:
-                if next_point.x >= 0 and next_point.x < self.width and next_point.y >= 0 and next_point.y < self.height:
-                    if path_map[next_point.x, next_point.y] in [ElementType.BACKGROUND.value, ElementType.GOAL.value, ElementType.LARGE_VISION.value]:
-                        path_map[next_point.x, next_point.y] = ElementType.VISITED.value
-                        queue.append(next_point)
+        # A start tile that cannot be walked on (ex. a wall) can still be left through its neighbors
+        distances = [goal_distances[tile.x * self.height + tile.y] for tile, _ in self.get_nearby_tiles(start.x, start.y)
+                     if tile.element in pathfinding.PASSABLE_ELEMENTS]
+        distances = [distance for distance in distances if distance >= 0]
+        return min(distances) + 1 if len(distances) > 0 else None
 
-        return valid_path
+    def path_exists(self, start: Position) -> bool:
+        return self.get_goal_distance(start) is not None
+
+    def _get_goal_path(self, start: Position) -> frozenset[int] | None:
+        """Flat indices of a shortest path from start to the goal, following the goal distances down, None if
+        start has no distance"""
+        goal_distances = self._get_goal_distances()
+        neighbors = pathfinding.get_neighbor_table(self.width, self.height)
+
+        index = start.x * self.height + start.y
+        if goal_distances[index] < 0:
+            return None
+
+        path = [index]
+        while goal_distances[index] > 0:
+            index = next(next_index for next_index in neighbors[index] if goal_distances[next_index] == goal_distances[index] - 1)
+            path.append(index)
+        return frozenset(path)
+
+    def is_blocking(self, position: Position, player_position: Position) -> bool:
+        """Whether blocking position would leave no path from the player to the goal. A position off the shortest
+        path given by the goal distances, which the score reads every turn anyway, cannot cut it, only the others
+        need a search going around them."""
+        if not self.path_exists(player_position):
+            return True
+
+        path = self._get_goal_path(player_position)
+        if path is not None and position.x * self.height + position.y not in path:
+            return False
+
+        return not pathfinding.path_exists(self.map, player_position, self.goal, GOAL_DISTANCE_ELEMENTS, blocked=position)
+
+    def get_blocking_cells(self, player_position: Position) -> frozenset[Position] | None:
+        """Tiles that would cut the player from the goal if blocked, None if it is already cut from it. Debug only,
+        it runs a full depth-first search on each call."""
+        return pathfinding.CutVertices(self.map, self.goal, GOAL_DISTANCE_ELEMENTS).get_separating_cells(player_position)
 
     @classmethod
-    def create_map(cls, width: int = 20, height: int = 20):
-        return cls(np.array([[ElementType.BACKGROUND.value] * width] * height))
+    def create_map(cls, rng: random.Random, width: int = 20, height: int = 20):
+        return cls(np.array([[ElementType.BACKGROUND.value] * width] * height), rng)
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from enum import Enum
+from typing import Iterator
+import bisect
+import time
+
+# Upper bounds of the histogram buckets in seconds, from in process bots to the request timeout
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Phase(Enum):
+    """Parts of a turn, in the order they are played"""
+    DEFENSE_RENDER = "defense_render"
+    DEFENSE_BOT = "defense_bot"
+    DEFENSE_VALIDATION = "defense_validation"
+    OFFENSE_RENDER = "offense_render"
+    OFFENSE_BOT = "offense_bot"
+    SCORE = "score"
+    TURN = "turn"
+
+class Histogram:
+    """Durations in seconds counted per bucket, the last bucket holding the ones above BUCKETS"""
+    counts: list[int]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, duration: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def __iter__(self) -> Iterator:
+        yield "count", self.count
+        yield "totalMs", round(self.total * 1000, 3)
+        yield "meanMs", round(self.total * 1000 / self.count, 3) if self.count > 0 else None
+        yield "maxMs", round(self.max * 1000, 3)
+
+class TurnMetrics:
+    """Histogram of the duration of each phase of the turns, durations are also added to the parent metrics if given"""
+    histograms: dict[Phase, Histogram]
+    parent: "TurnMetrics | None"
+
+    def __init__(self, parent: "TurnMetrics | None" = None) -> None:
+        self.histograms = {phase: Histogram() for phase in Phase}
+        self.parent = parent
+
+    def observe(self, phase: Phase, duration: float) -> None:
+        self.histograms[phase].observe(duration)
+        if self.parent is not None:
+            self.parent.observe(phase, duration)
+
+    @contextmanager
+    def time(self, phase: Phase) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def __iter__(self) -> Iterator:
+        for phase, histogram in self.histograms.items():
+            yield phase.value, dict(histogram)
+
+    def to_prometheus(self, name: str) -> str:
+        """Histograms in the Prometheus text format, labelled by phase"""
+        lines = [f"# HELP {name} Duration of the phases of the game turns",
+                 f"# TYPE {name} histogram"]
+        for phase, histogram in self.histograms.items():
+            cumulative = 0
+            for bound, count in zip([*map(str, BUCKETS), "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{phase="{phase.value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{phase="{phase.value}"}} {histogram.total}')
+            lines.append(f'{name}_count{{phase="{phase.value}"}} {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+# Every turn played by the process, exposed by /metrics
+PROCESS_METRICS = TurnMetrics()
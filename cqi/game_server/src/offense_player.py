@@ -1,5 +1,3 @@
-import random
-
 from game_server_common.base import ElementType, OffenseMove
 
 from .logger import Level, Logger
@@ -19,7 +17,7 @@ class OffensePlayer:
         self.map = map
         self.logger = logger
 
-        self.position = Position(0, random.randint(0, map.height - 1))
+        self.position = Position(0, map.rng.randint(0, map.height - 1))
         self.map.set(self.position.x, self.position.y, ElementType.PLAYER_OFFENSE)
         self.is_large_vision = False
     
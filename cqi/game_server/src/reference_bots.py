@@ -0,0 +1,40 @@
+import importlib
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Callable
+
+from .bot_client import InProcessBot, InProcessBotClient
+
+# The bots have their own src package, it is loaded under another name to live next to the game server one
+BOT_PACKAGE = "cqi_bot"
+BOT_SOURCE = Path(__file__).resolve().parents[2] / "bot" / "src"
+
+
+def _import_bot_module(name: str) -> ModuleType:
+    if BOT_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(BOT_PACKAGE, BOT_SOURCE / "__init__.py", submodule_search_locations=[str(BOT_SOURCE)])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[BOT_PACKAGE] = package
+        spec.loader.exec_module(package)
+
+    return importlib.import_module(f"{BOT_PACKAGE}.{name}")
+
+
+def _defense(bot) -> InProcessBot:
+    return _import_bot_module("defense.defense").Defense(bot)
+
+
+# Reference bots of cqi/bot built from the /start payload, as its web server does
+REFERENCE_BOTS: dict[str, Callable[[dict], InProcessBot]] = {
+    "shortest_path": lambda start: _import_bot_module("offense.shortest_path_bot").ShortestPathBot(),
+    "dumb": lambda start: _import_bot_module("offense.offense_bot").DumbOffenseBot(),
+    "blocker": lambda start: _defense(_import_bot_module("defense.bots").BlockerDefenseBot(n_walls=start["n_walls"])),
+    "random": lambda start: _defense(_import_bot_module("defense.bots").RandomDefenseBot()),
+}
+
+
+def create_reference_client(name: str) -> InProcessBotClient:
+    """In process client of a reference bot, see REFERENCE_BOTS for the names"""
+    return InProcessBotClient(REFERENCE_BOTS[name])
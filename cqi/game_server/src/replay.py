@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+import random
+from typing import Iterator
+
+from .bot_client import BotClient, BotError, BotExchange, BotResponse
+from .game_handler import GameHandler
+from .logger import GameStep
+from .metrics import TurnMetrics
+
+REPLAY_VERSION = 1
+
+
+@dataclass
+class GameReplay:
+    """Inputs of a game: the map and positions come from the seed, everything else from the responses of the bots"""
+    seed: str
+    max_move: int | None
+    offense_exchanges: list[BotExchange]
+    defense_exchanges: list[BotExchange]
+
+    def __iter__(self) -> Iterator:
+        yield "version", REPLAY_VERSION
+        yield "seed", self.seed
+        yield "maxMove", self.max_move
+        yield "offense", [dict(exchange) for exchange in self.offense_exchanges]
+        yield "defense", [dict(exchange) for exchange in self.defense_exchanges]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameReplay":
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version: {data.get('version')}")
+
+        return cls(seed=data["seed"],
+                   max_move=data["maxMove"],
+                   offense_exchanges=[BotExchange.from_dict(exchange) for exchange in data["offense"]],
+                   defense_exchanges=[BotExchange.from_dict(exchange) for exchange in data["defense"]])
+
+
+class ReplayBotClient(BotClient):
+    """Answers with the recorded exchanges of a bot, in order"""
+    _recorded: Iterator[BotExchange]
+
+    def __init__(self, exchanges: list[BotExchange]) -> None:
+        super().__init__()
+        self._recorded = iter(exchanges)
+
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        exchange = next(self._recorded, None)
+        if exchange is None:
+            raise BotError(f"No recorded response left for {endpoint}")
+        if exchange.error is not None:
+            raise BotError(exchange.error)
+
+        return exchange.response
+
+
+async def replay_game(replay: GameReplay, n_steps: int | None = None) -> GameHandler:
+    """Plays the game again from its inputs, stopping after n_steps turns if given"""
+    # Replayed turns are not played by the bots, they are kept out of the process metrics
+    game_handler = GameHandler(ReplayBotClient(replay.offense_exchanges), ReplayBotClient(replay.defense_exchanges), replay.max_move,
+                               random.Random(replay.seed), metrics=TurnMetrics())
+
+    await game_handler.start_game()
+    while not game_handler.is_over and (n_steps is None or game_handler.move_count < n_steps):
+        await game_handler.play()
+
+    return game_handler
+
+
+async def replay_step(replay: GameReplay, index: int) -> GameStep:
+    """Rebuilds a single step of the game, the step 0 being the start of the game"""
+    steps = (await replay_game(replay, index)).logger.get()
+    if not 0 <= index < len(steps):
+        raise IndexError(f"Step {index} out of range, the game has {len(steps)} steps")
+
+    return steps[index]
@@ -55,11 +55,8 @@ class Timebomb:
             self._logger.add(f"Cannot add timebomb, either a bomb is already present or the cooldown period is not over", Level.INFO)
             return False
         
-        self._map.set(bomb_position.x, bomb_position.y, ElementType.TIMEBOMB)
-
-        if not self._map.path_exists(player_position):
+        if self._map.is_blocking(bomb_position, player_position):
             self._logger.add(f"Cannot add timebomb, no path from player to goal", Level.INFO)
-            self._map.set(bomb_position.x, bomb_position.y, ElementType.BACKGROUND)
             return False
         
         self._position = bomb_position
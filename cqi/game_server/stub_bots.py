@@ -0,0 +1,155 @@
+"""Bots and clients playing the games of the tests and benchmark.py"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from game_server_common.base import OffenseMove
+from src.bot_client import BotClient, BotError, BotResponse, InProcessBotClient
+from src.game_handler import END_ENDPOINT, GameHandler, NEXT_ENDPOINT, START_ENDPOINT, TIMEOUT
+
+
+class RandomBotClient(BotClient):
+    """In process bot playing random moves, with a few failed and invalid responses"""
+    rng: random.Random
+    is_offense: bool
+
+    def __init__(self, seed: int, is_offense: bool) -> None:
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.is_offense = is_offense
+
+    async def _post(self, endpoint: str, json: dict, timeout: float | None) -> BotResponse:
+        if endpoint != NEXT_ENDPOINT:
+            return BotResponse(200, '{"map_encoding": "grid"}')
+
+        roll = self.rng.random()
+        if roll < 0.02:
+            raise BotError("Read timed out")
+        if roll < 0.04:
+            return BotResponse(500, "Internal Server Error")
+
+        if self.is_offense:
+            return BotResponse(200, f'{{"move": "{self.rng.choice(list(OffenseMove)).value}"}}')
+
+        width, height = json["shape"]
+        element = self.rng.choice(["wall", "wall", "timebomb", "skip"])
+        return BotResponse(200, f'{{"x": {self.rng.randrange(width)}, "y": {self.rng.randrange(height)}, "element": "{element}"}}')
+
+
+async def play_game(game_handler: GameHandler) -> GameHandler:
+    await game_handler.start_game()
+    while not game_handler.is_over:
+        await game_handler.play()
+    return game_handler
+
+
+def game_data_body(game_handler: GameHandler) -> bytes:
+    """Game data without the timings, which differ from a run to the other"""
+    data = dict(game_handler.get_data())
+    del data["timings"]
+    return json.dumps(data).encode()
+
+
+class StubBotHandler(BaseHTTPRequestHandler):
+    """Bot skipping every turn, for both roles, that signals the first turn it is asked to play"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    first_turn = threading.Event()
+    start_delay = 0.0
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == START_ENDPOINT:
+            time.sleep(StubBotHandler.start_delay)
+        if self.path == NEXT_ENDPOINT:
+            StubBotHandler.first_turn.set()
+
+        body = b'{"move": "skip", "x": 0, "y": 0, "element": "skip"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class HangingBotHandler(StubBotHandler):
+    """Bot that starts then stops answering, as a crashed bot behind a live container"""
+    def do_POST(self) -> None:
+        if self.path == NEXT_ENDPOINT:
+            time.sleep(TIMEOUT + 1)
+        super().do_POST()
+
+
+class SlowBotHandler(StubBotHandler):
+    """Bot taking delay seconds to answer each turn"""
+    delay = 0.0
+
+    def do_POST(self) -> None:
+        if self.path == NEXT_ENDPOINT:
+            time.sleep(SlowBotHandler.delay)
+        super().do_POST()
+
+
+class StubBotServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address) -> None:
+        # Clients closing their keep-alive connection between games are expected
+        pass
+
+
+def start_stub_bot(handler: type[BaseHTTPRequestHandler] = StubBotHandler) -> ThreadingHTTPServer:
+    server = StubBotServer(("localhost", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class EncodedInProcessBotClient(InProcessBotClient):
+    """In process client sending encoded maps like the web server, used as a reference for the grid one"""
+    takes_grid = False
+
+    def _play(self, payload: dict) -> list[OffenseMove] | OffenseMove | tuple | None:
+        if self.is_offense and hasattr(self.bot, "plan"):
+            return self.bot.plan(payload["map"], payload.get("shape"), payload.get("executed_moves", 0))
+
+        return self.bot.play(payload["map"], payload.get("shape"))
+
+
+class SingleMoveInProcessBotClient(InProcessBotClient):
+    """In process client dropping the queued moves, as a bot answering one move at a time"""
+    def _play(self, payload: dict) -> list[OffenseMove] | OffenseMove | tuple | None:
+        result = super()._play(payload)
+        return result[:1] if isinstance(result, list) else result
+
+
+BOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+
+
+def start_bot_app(env: dict[str, str]) -> tuple[subprocess.Popen, str]:
+    """Runs the bot of the repository in its own process, as the game server sees it in a real game"""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=BOT_DIRECTORY, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               env={**os.environ, "PORT": str(port), "MODE": "release", **env})
+    url = f"http://localhost:{port}"
+    for _ in range(100):
+        try:
+            requests.post(url + END_ENDPOINT, timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError(f"The bot on {url} did not start")
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import game_server_common.helpers as helpers
+from game_server_common.base import ElementType, MapEncoding
+from src.game_handler import BotOptions, encode_map_payload
+from src.map import TILE_SIZE
+from src.offense_player import OFFENSE_VISION_RADIUS
+from reference import legacy_get_block_size, legacy_parse_data, random_map
+
+SIZES = [10, 25, 40]
+PLAYER_COLOR = ElementType.PLAYER_OFFENSE.to_color()
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_decoder_matches_per_tile_decoder(size: int) -> None:
+    map, offense_player = random_map(size, 0)
+    data = helpers.parse_base64(map.to_img_64(offense_player.position))
+
+    decoded_map, positions = helpers.parse_data(data, (TILE_SIZE, TILE_SIZE))
+    legacy_map, legacy_positions = legacy_parse_data(data, (TILE_SIZE, TILE_SIZE))
+    assert (decoded_map.map == legacy_map).all()
+    assert positions == legacy_positions
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_block_size_matches_per_pixel_detection(size: int) -> None:
+    map, offense_player = random_map(size, 0)
+    data = helpers.parse_base64(map.to_img_64(offense_player.position))
+
+    assert helpers.get_block_size(data, PLAYER_COLOR) == legacy_get_block_size(data, PLAYER_COLOR) == (TILE_SIZE, TILE_SIZE)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_block_size_of_player_far_from_the_start(size: int) -> None:
+    map, offense_player = random_map(size, 0)
+    player = offense_player.position
+    map.set(player.x, player.y, ElementType.BACKGROUND)
+    map.set(size - 1, size - 1, ElementType.PLAYER_OFFENSE)
+    data = helpers.parse_base64(map.to_img_64(player))
+
+    assert helpers.get_block_size(data, PLAYER_COLOR) == legacy_get_block_size(data, PLAYER_COLOR) == (TILE_SIZE, TILE_SIZE)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_block_size_without_player(size: int) -> None:
+    map, offense_player = random_map(size, 0)
+    player = offense_player.position
+    map.set(player.x, player.y, ElementType.BACKGROUND)
+    data = helpers.parse_base64(map.to_img_64(player))
+
+    assert helpers.get_block_size(data, PLAYER_COLOR) is None
+    assert TILE_SIZE % helpers.get_grid_block_size(data)[0] == 0
+
+
+def test_block_size_cache_retries_detection_until_the_player_is_found() -> None:
+    map, offense_player = random_map(10, 0)
+    player = offense_player.position
+    block_sizes = helpers.BlockSizeCache()
+
+    map.map[:] = ElementType.BACKGROUND.value
+    uniform = helpers.parse_base64(map.to_img_64(player))
+    # Without any color change, the grid fallback can only take the whole frame as a block
+    assert block_sizes.get(uniform, PLAYER_COLOR) == uniform.shape[:2]
+
+    map.set(player.x, player.y, ElementType.PLAYER_OFFENSE)
+    data = helpers.parse_base64(map.to_img_64(player))
+    assert block_sizes.get(data, PLAYER_COLOR) == (TILE_SIZE, TILE_SIZE)
+    assert block_sizes.get(uniform, PLAYER_COLOR) == (TILE_SIZE, TILE_SIZE)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("visibility_range", [None, OFFENSE_VISION_RADIUS])
+@pytest.mark.parametrize("encoding", list(MapEncoding))
+def test_encoded_payload_decodes_to_visible_grid(size: int, visibility_range: int | None, encoding: MapEncoding) -> None:
+    map, offense_player = random_map(size, 0)
+    grid = map.get_visible_grid(offense_player.position, visibility_range)
+
+    payload = json.loads(json.dumps(encode_map_payload(grid, BotOptions(map_encoding=encoding))))
+    if "shape" in payload:
+        decoded_map, _ = helpers.parse_grid(payload["map"], payload["shape"])
+    else:
+        data = helpers.parse_base64(payload["map"])
+        decoded_map, _ = helpers.parse_data(data, helpers.BlockSizeCache().get(data, PLAYER_COLOR))
+
+    assert (decoded_map.map == grid).all()
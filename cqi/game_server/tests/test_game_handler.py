@@ -0,0 +1,40 @@
+import asyncio
+import json
+import random
+
+from src.bot_client import BotClient, BotResponse
+from src.game_handler import GameHandler, NEXT_ENDPOINT
+
+
+class ScriptedBotClient(BotClient):
+    """Bot answering each /next_move with the next response of the script, keeping the requests it received"""
+    responses: list[dict]
+    requests: list[dict]
+
+    def __init__(self, responses: list[dict]) -> None:
+        super().__init__()
+        self.responses = responses
+        self.requests = []
+
+    async def _post(self, endpoint: str, json_body: dict, timeout: float | None) -> BotResponse:
+        if endpoint != NEXT_ENDPOINT:
+            return BotResponse(200, "OK")
+
+        self.requests.append(json_body)
+        return BotResponse(200, json.dumps(self.responses.pop(0) if self.responses else {"move": "skip"}))
+
+
+def test_failed_queued_move_is_not_executed() -> None:
+    # The player starts on the left edge, moving left fails and clears the queue
+    offense_bot = ScriptedBotClient([{"move": "skip", "moves": ["skip", "left", "skip"]}])
+    defense_bot = ScriptedBotClient([])
+    game_handler = GameHandler(offense_bot, defense_bot, 5, random.Random("0"))
+
+    async def play() -> None:
+        await game_handler.start_game()
+        for _ in range(4):
+            await game_handler.play()
+    asyncio.run(play())
+
+    assert len(offense_bot.requests) == 2
+    assert offense_bot.requests[1]["executed_moves"] == 1
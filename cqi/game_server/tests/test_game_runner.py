@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import random
+
+from src.game_handler import GameHandler
+from src.game_runner import Runner
+from stub_bots import RandomBotClient
+
+
+class ClosedRandomBotClient(RandomBotClient):
+    is_closed = False
+
+    async def close(self) -> None:
+        self.is_closed = True
+
+
+def test_unexpected_error_ends_the_game() -> None:
+    offense_bot, defense_bot = ClosedRandomBotClient(0, True), ClosedRandomBotClient(0, False)
+    game_handler = GameHandler(offense_bot, defense_bot, None, random.Random("0"))
+    play = game_handler.play
+
+    async def failing_play() -> None:
+        if game_handler.move_count == 3:
+            raise RuntimeError("Broken turn")
+        await play()
+    game_handler.play = failing_play
+
+    async def run() -> list[bytes]:
+        runner = Runner()
+        runner.game_handler = game_handler
+        runner.game_task = asyncio.create_task(runner._play_game(game_handler))
+        events = [event async for event in runner.stream()]
+        await runner.game_task
+
+        status = runner.status()
+        assert not status.is_running and status.is_over
+        assert "Broken turn" in status.game_data.error_message
+        return events
+
+    logging.disable(logging.CRITICAL)
+    try:
+        events = asyncio.run(run())
+    finally:
+        logging.disable(logging.NOTSET)
+
+    assert events[-1].startswith(b"event: end\n") and b"Broken turn" in events[-1]
+    assert offense_bot.is_closed and defense_bot.is_closed
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import random
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import src.game_handler
+import stub_bots
+from game_server_common.base import MapEncoding, Transport
+from src.bot_client import BREAKER_THRESHOLD, CircuitBreaker, HttpBotClient, InProcessBotClient, TIME_BANK_EXHAUSTED, TimeBankSettings
+from src.game_handler import GameHandler
+from src.game_runner import Runner
+from src.reference_bots import REFERENCE_BOTS
+from src.replay import GameReplay, replay_game
+from stub_bots import (EncodedInProcessBotClient, HangingBotHandler, SingleMoveInProcessBotClient, SlowBotHandler, StubBotHandler, game_data_body,
+                       play_game, start_bot_app, start_stub_bot)
+
+SEEDS = [str(seed) for seed in range(3)]
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logging.disable(logging.ERROR)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def play_reference_game(client_type: type[InProcessBotClient], offense: str, defense: str, seed: str) -> GameHandler:
+    # The reference bots draw from the global generators when they have no path
+    random.seed(seed)
+    np.random.seed(0)
+    game_handler = GameHandler(client_type(REFERENCE_BOTS[offense]), client_type(REFERENCE_BOTS[defense]), None, random.Random(seed))
+    return asyncio.run(play_game(game_handler))
+
+
+@pytest.mark.parametrize("offense, defense", [("shortest_path", "blocker"), ("dumb", "random")])
+@pytest.mark.parametrize("seed", SEEDS)
+def test_in_process_grid_matches_encoded_maps(offense: str, defense: str, seed: str) -> None:
+    assert game_data_body(play_reference_game(InProcessBotClient, offense, defense, seed)) == \
+        game_data_body(play_reference_game(EncodedInProcessBotClient, offense, defense, seed))
+
+
+@pytest.mark.parametrize("client_type", [SingleMoveInProcessBotClient, InProcessBotClient])
+@pytest.mark.parametrize("defense", ["blocker", "random"])
+@pytest.mark.parametrize("seed", SEEDS)
+def test_queued_moves_replay(client_type: type[InProcessBotClient], defense: str, seed: str) -> None:
+    game_handler = play_reference_game(client_type, "shortest_path", defense, seed)
+
+    replayed = asyncio.run(replay_game(GameReplay(seed, None, game_handler.offense_bot.exchanges, game_handler.defense_bot.exchanges)))
+    assert game_data_body(replayed) == game_data_body(game_handler)
+
+
+def test_breaker_does_not_change_the_game(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The hanging bot answers after TIMEOUT + 1 seconds
+    monkeypatch.setattr(src.game_handler, "TIMEOUT", 0.2)
+    monkeypatch.setattr(stub_bots, "TIMEOUT", 0.2)
+    stub_server, hanging_server = start_stub_bot(), start_stub_bot(HangingBotHandler)
+
+    async def play(breaker: CircuitBreaker) -> GameHandler:
+        offense_bot = HttpBotClient(f"http://localhost:{hanging_server.server_address[1]}")
+        offense_bot.breaker = breaker
+        game_handler = GameHandler(offense_bot, HttpBotClient(f"http://localhost:{stub_server.server_address[1]}"), 10, random.Random("0"))
+        await play_game(game_handler)
+        await game_handler.close()
+        return game_handler
+
+    try:
+        without_breaker = asyncio.run(play(CircuitBreaker(threshold=sys.maxsize)))
+        with_breaker = asyncio.run(play(CircuitBreaker()))
+    finally:
+        stub_server.shutdown()
+        hanging_server.shutdown()
+
+    assert [dict(step)["map"] for step in with_breaker.logger.get()] == [dict(step)["map"] for step in without_breaker.logger.get()]
+    assert any("skipped" in (exchange.error or "") for exchange in with_breaker.offense_bot.exchanges)
+
+
+def test_game_against_a_dead_bot_only_waits_for_the_breaker(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(src.game_handler, "TIMEOUT", 0.2)
+    monkeypatch.setattr(stub_bots, "TIMEOUT", 0.2)
+    hanging_server = start_stub_bot(HangingBotHandler)
+
+    async def play() -> GameHandler:
+        offense_bot = HttpBotClient(f"http://localhost:{hanging_server.server_address[1]}")
+        game_handler = GameHandler(offense_bot, InProcessBotClient(REFERENCE_BOTS["random"]), None, random.Random("0"))
+        await play_game(game_handler)
+        await game_handler.close()
+        return game_handler
+
+    try:
+        start = time.monotonic()
+        game_handler = asyncio.run(play())
+        duration = time.monotonic() - start
+    finally:
+        hanging_server.shutdown()
+
+    # A full length game, where only the requests opening the breaker wait for the timeout, the turns after it
+    # take a few milliseconds in all
+    assert game_handler.move_count == game_handler.max_move
+    assert sum("timed out" in (exchange.error or "") for exchange in game_handler.offense_bot.exchanges) == BREAKER_THRESHOLD
+    assert duration < 0.2 * BREAKER_THRESHOLD + 1
+
+
+@pytest.mark.parametrize("time_bank_settings", [None, TimeBankSettings(turn_time=0.05, budget=0.2)])
+def test_time_bank_forfeits_only_when_enabled(monkeypatch: pytest.MonkeyPatch, time_bank_settings: TimeBankSettings | None) -> None:
+    monkeypatch.setattr(SlowBotHandler, "delay", 0.15)
+    stub_server, slow_server = start_stub_bot(), start_stub_bot(SlowBotHandler)
+
+    async def play() -> GameHandler:
+        offense_bot = HttpBotClient(f"http://localhost:{slow_server.server_address[1]}", time_bank_settings)
+        game_handler = GameHandler(offense_bot, HttpBotClient(f"http://localhost:{stub_server.server_address[1]}"), 10, random.Random("0"))
+        await play_game(game_handler)
+        await game_handler.close()
+        return game_handler
+
+    try:
+        game_handler = asyncio.run(play())
+    finally:
+        stub_server.shutdown()
+        slow_server.shutdown()
+
+    forfeited = sum(exchange.error == TIME_BANK_EXHAUSTED for exchange in game_handler.offense_bot.exchanges)
+    assert (forfeited > 0) == (time_bank_settings is not None)
+
+
+def test_runner_plays_the_first_turn() -> None:
+    server = start_stub_bot()
+    url = f"http://localhost:{server.server_address[1]}"
+
+    async def launch() -> bool:
+        runner = Runner()
+        StubBotHandler.first_turn.clear()
+        runner.launch_game(url, url, "0", max_move=5)
+        played = await asyncio.to_thread(StubBotHandler.first_turn.wait, 5)
+        await runner.stop()
+        return played
+
+    try:
+        assert asyncio.run(launch())
+    finally:
+        server.shutdown()
+
+
+def test_transports_play_the_same_games() -> None:
+    games: dict[str, list[bytes]] = {}
+    for transport, env in [("png", {}), ("grid", {"MAP_ENCODING": MapEncoding.GRID.value}), ("websocket", {"TRANSPORT": Transport.WEBSOCKET.value})]:
+        bots = [start_bot_app(env) for _ in range(2)]
+        try:
+            for seed in SEEDS[:2]:
+                random.seed(seed)
+                offense_bot, defense_bot = HttpBotClient(bots[0][1]), HttpBotClient(bots[1][1])
+                game_handler = GameHandler(offense_bot, defense_bot, None, random.Random(seed))
+
+                async def play() -> None:
+                    await play_game(game_handler)
+                    await game_handler.close()
+
+                asyncio.run(play())
+                replayed = asyncio.run(replay_game(GameReplay(seed, None, offense_bot.exchanges, defense_bot.exchanges)))
+                assert game_data_body(replayed) == game_data_body(game_handler)
+                games.setdefault(transport, []).append(game_data_body(game_handler))
+        finally:
+            for process, _ in bots:
+                process.kill()
+                process.wait()
+
+    assert games["png"] == games["grid"] == games["websocket"]
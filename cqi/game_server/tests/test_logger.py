@@ -0,0 +1,25 @@
+import pytest
+
+from src.logger import Logger
+from reference import play_random_game
+
+
+@pytest.mark.parametrize("size", [10, 25])
+def test_history_matches_full_frames(size: int) -> None:
+    steps = play_random_game(size, 0)
+    logger = Logger()
+    for grid, score, vision_radius in steps:
+        logger.add_step(grid, score, vision_radius)
+
+    assert [step.map for step in logger.get()] == [[[str(row) for row in col] for col in grid.tolist()] for grid, _, _ in steps]
+    assert [step.score for step in logger.get()] == [score for _, score, _ in steps]
+
+
+def test_iter_steps_matches_get() -> None:
+    logger = Logger()
+    for grid, score, vision_radius in play_random_game(10, 0):
+        logger.add_step(grid, score, vision_radius)
+
+    steps = [dict(step) for step in logger.get()]
+    for start, stop in [(0, None), (5, 12), (logger.n_steps - 1, None)]:
+        assert [dict(step) for step in logger.iter_steps(start, stop)] == steps[start:stop]
@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+import pytest
+
+from game_server_common.base import ElementType, Position
+from game_server_common.map import Map
+from reference import RANDOM_ELEMENTS, random_map
+
+
+def scanned_positions(map: Map, element_type: ElementType) -> set[Position]:
+    return {Position(int(x), int(y)) for x, y in np.argwhere(map.map == element_type.value)}
+
+
+@pytest.mark.parametrize("size", [10, 25, 40])
+def test_positions_follow_the_changes(size: int) -> None:
+    map, _ = random_map(size, 0)
+    rng = random.Random(0)
+
+    for _ in range(200):
+        map.set(rng.randint(0, size - 1), rng.randint(0, size - 1), rng.choice(RANDOM_ELEMENTS))
+
+    for element_type in ElementType:
+        assert map.get_positions(element_type) == scanned_positions(map, element_type)
+
+
+def test_positions_are_a_read_only_view() -> None:
+    map = Map(np.full((4, 3), ElementType.BACKGROUND.value))
+    goals = map.get_positions(ElementType.GOAL)
+    assert len(goals) == 0
+    assert map.get_position(ElementType.GOAL) is None
+
+    map.set(3, 2, ElementType.GOAL)
+    assert map.get_positions(ElementType.GOAL) is goals
+    assert list(goals) == [Position(3, 2)]
+    assert map.get_position(ElementType.GOAL) == Position(3, 2)
+    assert not hasattr(goals, "add")
+
+    # Out of range positions must not alias cells of the next column
+    assert Position(2, 5) not in goals and Position(-1, 2) not in goals
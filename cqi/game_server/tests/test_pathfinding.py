@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+import pytest
+
+from game_server_common import pathfinding
+from game_server_common.base import ElementType, Position
+from reference import legacy_shortest_path, random_map
+
+PASSABLE_VALUES = [element.value for element in pathfinding.PASSABLE_ELEMENTS]
+WALL_RATIOS = [0.1, 0.3, 0.5]
+
+
+@pytest.mark.parametrize("size", [20, 40])
+@pytest.mark.parametrize("wall_ratio", WALL_RATIOS)
+def test_shortest_path_matches_path_copying_search(size: int, wall_ratio: float) -> None:
+    map, offense_player = random_map(size, 0, wall_ratio)
+    start = offense_player.position
+
+    rng = random.Random(0)
+    for _ in range(20):
+        end = Position(rng.randint(0, size - 1), rng.randint(0, size - 1))
+        for fallback_to_last in [False, True]:
+            assert pathfinding.shortest_path(map.map, start, end, fallback_to_last=fallback_to_last) == \
+                legacy_shortest_path(map.map, start, end, PASSABLE_VALUES, fallback_to_last)
+
+
+@pytest.mark.parametrize("size", [20, 40])
+@pytest.mark.parametrize("wall_ratio", WALL_RATIOS)
+def test_goal_distance_follows_the_walls(size: int, wall_ratio: float) -> None:
+    map, offense_player = random_map(size, 0, wall_ratio)
+    rng = random.Random(0)
+    for _ in range(30):
+        wall = Position(rng.randint(0, size - 1), rng.randint(0, size - 1))
+        if map.get(wall.x, wall.y).element == ElementType.BACKGROUND:
+            map.set(wall.x, wall.y, ElementType.WALL)
+
+        position = offense_player.position
+        distance = map.get_goal_distance(position)
+        path = pathfinding.shortest_path(map.map, position, map.goal)
+        assert distance == (len(path) - 1 if path else None)
+
+
+@pytest.mark.parametrize("size", [20, 40])
+@pytest.mark.parametrize("wall_ratio", [0.1, 0.3, 0.45])
+def test_blocking_matches_placing_the_wall(size: int, wall_ratio: float) -> None:
+    map, offense_player = random_map(size, 0, wall_ratio)
+    player = offense_player.position
+    candidates = [Position(int(x), int(y)) for x, y in np.argwhere(map.map == ElementType.BACKGROUND.value)]
+
+    for position in random.Random(0).sample(candidates, min(len(candidates), 100)):
+        map.set(position.x, position.y, ElementType.WALL)
+        is_blocking = not map.path_exists(player)
+        map.set(position.x, position.y, ElementType.BACKGROUND)
+
+        assert map.is_blocking(position, player) == is_blocking
+        # Walls that keep a path are kept, so the next checks run on a changing map
+        if not is_blocking:
+            map.set(position.x, position.y, ElementType.WALL)
+
+
+@pytest.mark.parametrize("wall_ratio", [0.1, 0.3])
+def test_blocking_cells(wall_ratio: float) -> None:
+    map, offense_player = random_map(20, 0, wall_ratio)
+    player = offense_player.position
+    blocking_cells = map.get_blocking_cells(player)
+    assert blocking_cells is not None
+
+    for x, y in np.argwhere(map.map == ElementType.BACKGROUND.value):
+        position = Position(int(x), int(y))
+        assert (position in blocking_cells) == map.is_blocking(position, player)
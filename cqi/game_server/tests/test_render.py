@@ -0,0 +1,35 @@
+import pytest
+
+import game_server_common.helpers as helpers
+from game_server_common.base import ElementType, Position
+from src.map import TILE_SIZE
+from src.offense_player import FULL_VISION_RADIUS, OFFENSE_VISION_RADIUS
+from reference import legacy_to_img_64, random_map
+
+
+@pytest.mark.parametrize("size", [10, 25, 40])
+def test_frames_match_per_tile_renderer(size: int) -> None:
+    map, _ = random_map(size, 0)
+    assert map.to_img_64(Position(size // 2, size // 2)) == legacy_to_img_64(map, Position(size // 2, size // 2))
+
+
+@pytest.mark.parametrize("size", [10, 25, 40])
+@pytest.mark.parametrize("visibility_range", [OFFENSE_VISION_RADIUS, FULL_VISION_RADIUS])
+def test_cropped_frames_match_per_tile_renderer(size: int, visibility_range: int) -> None:
+    map, _ = random_map(size, 0)
+    for corner in [Position(size // 2, size // 2), Position(0, 0), Position(size - 1, size - 2)]:
+        assert map.to_img_64(corner, visibility_range) == legacy_to_img_64(map, corner, visibility_range)
+
+
+@pytest.mark.parametrize("size", [10, 40])
+@pytest.mark.parametrize("visibility_range", [None, OFFENSE_VISION_RADIUS])
+@pytest.mark.parametrize("tile_size", [10, 5, 2, 1])
+def test_smaller_tiles_decode_to_the_same_map(size: int, visibility_range: int | None, tile_size: int) -> None:
+    map, offense_player = random_map(size, 0)
+
+    def decode(frame: bytes):
+        data = helpers.parse_base64(frame)
+        return helpers.parse_data(data, helpers.get_block_size(data, ElementType.PLAYER_OFFENSE.to_color()))[0].map
+
+    frame = map.to_img_64(offense_player.position, visibility_range, tile_size)
+    assert (decode(frame) == decode(map.to_img_64(offense_player.position, visibility_range, TILE_SIZE))).all()
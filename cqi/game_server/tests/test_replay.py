@@ -0,0 +1,81 @@
+import asyncio
+import json
+import random
+import tracemalloc
+
+import pytest
+
+from src.game_handler import GameHandler
+from src.game_runner import GameServerStatus, Runner
+from src.metrics import PROCESS_METRICS, Phase
+from src.replay import GameReplay, replay_game, replay_step
+from stub_bots import RandomBotClient, game_data_body, play_game
+
+SEEDS = range(3)
+
+
+def play_random_bots(seed: int) -> GameHandler:
+    return asyncio.run(play_game(GameHandler(RandomBotClient(seed, True), RandomBotClient(seed, False), None, random.Random(str(seed)))))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_replay_matches_game(seed: int) -> None:
+    game_handler = play_random_bots(seed)
+    replay = GameReplay(str(seed), None, game_handler.offense_bot.exchanges, game_handler.defense_bot.exchanges)
+
+    replayed = asyncio.run(replay_game(GameReplay.from_dict(json.loads(json.dumps(dict(replay))))))
+    assert game_data_body(replayed) == game_data_body(game_handler)
+
+    middle = game_handler.logger.n_steps // 2
+    assert dict(asyncio.run(replay_step(replay, middle))) == dict(game_handler.logger.get()[middle])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_serialized_status_matches_dumps(seed: int) -> None:
+    game_handler = play_random_bots(seed)
+    status = GameServerStatus(False, True, game_handler.score, game_handler.get_data())
+
+    assert status.serialized.body == json.dumps(dict(status)).encode()
+
+
+def test_replays_are_kept_out_of_the_process_metrics() -> None:
+    process_turns = PROCESS_METRICS.histograms[Phase.TURN]
+    played_turns = process_turns.count
+    game_handler = play_random_bots(0)
+    assert process_turns.count == played_turns + game_handler.metrics.histograms[Phase.TURN].count
+
+    replay = GameReplay("0", None, game_handler.offense_bot.exchanges, game_handler.defense_bot.exchanges)
+    played_turns = process_turns.count
+    replayed = asyncio.run(replay_game(replay))
+    asyncio.run(replay_step(replay, 5))
+    assert replayed.metrics.histograms[Phase.TURN].count > 0
+    assert process_turns.count == played_turns
+
+
+def test_finished_game_keeps_only_the_serialized_status() -> None:
+    game_handler = play_random_bots(0)
+
+    tracemalloc.start()
+    status = GameServerStatus(False, True, game_handler.score, game_handler.get_data())
+    status.serialized.gzip_body
+    kept, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # The full frames of the game take about ten times the body
+    assert kept < 1.5 * (len(status.serialized.body) + len(status.serialized.gzip_body))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_stream_matches_steps(seed: int) -> None:
+    runner = Runner()
+    runner.game_handler = GameHandler(RandomBotClient(seed, True), RandomBotClient(seed, False), None, random.Random(str(seed)))
+    asyncio.run(runner._play_game(runner.game_handler))
+
+    async def read_stream() -> list[bytes]:
+        return [event async for event in runner.stream()]
+
+    events = asyncio.run(read_stream())
+    steps = [json.loads(event.split(b"data: ", 1)[1]) for event in events[:-1]]
+    assert [step.pop("index") for step in steps] == list(range(len(steps)))
+    assert steps == [dict(step) for step in runner.game_handler.get_data().steps]
+    assert events[-1].startswith(b"event: end\n")
@@ -54,6 +54,17 @@ class OffenseMove(Enum):
                 return Position(0, 0)
 
 
+class MapEncoding(Enum):
+    PNG = "png"
+    GRID = "grid"
+
+
+class Transport(Enum):
+    """How the game server talks to a bot after /start, see game_server_common.frames for the websocket frames"""
+    HTTP = "http"
+    WEBSOCKET = "websocket"
+
+
 class ElementType(Enum):
     UNKNOWN = -2
     VISITED = -1
@@ -0,0 +1,58 @@
+import json
+import struct
+
+import numpy as np
+
+from .base import DefenseMove, OffenseMove, Position
+
+# Binary frames of the websocket transport. The game server sends a frame for each /next_move request and one for
+# /end_game, the bot answers each /next_move frame with a frame holding its move, an empty frame if it cannot play.
+NEXT_MOVE_FRAME = 1
+END_GAME_FRAME = 2
+END_GAME = bytes([END_GAME_FRAME])
+
+# Frame type, width and height of the grid
+_NEXT_MOVE_HEADER = struct.Struct(">BHH")
+# x, y and element
+_DEFENSE_MOVE = struct.Struct(">hhB")
+
+# A move is sent as its index in these lists
+OFFENSE_MOVES = list(OffenseMove)
+DEFENSE_MOVES = list(DefenseMove)
+
+
+def get_frame_type(frame: bytes) -> int:
+    return frame[0]
+
+
+def encode_next_move(grid: np.ndarray, fields: dict) -> bytes:
+    """Header, one int8 per tile in row-major (x, y) order as game_server_common.map.encode_grid, then the other
+    fields of the request as JSON, if any"""
+    width, height = grid.shape
+    return _NEXT_MOVE_HEADER.pack(NEXT_MOVE_FRAME, width, height) + grid.astype(np.int8).tobytes() + \
+        (json.dumps(fields).encode() if fields else b"")
+
+
+def decode_next_move(frame: bytes) -> tuple[np.ndarray, dict]:
+    _, width, height = _NEXT_MOVE_HEADER.unpack_from(frame)
+    end = _NEXT_MOVE_HEADER.size + width * height
+    grid = np.frombuffer(frame, dtype=np.int8, count=width * height, offset=_NEXT_MOVE_HEADER.size).reshape(width, height)
+    return grid, json.loads(frame[end:]) if len(frame) > end else {}
+
+
+def encode_offense_moves(moves: list[OffenseMove]) -> bytes:
+    """The move to play followed by the queued moves"""
+    return bytes(OFFENSE_MOVES.index(move) for move in moves)
+
+
+def decode_offense_moves(frame: bytes) -> list[OffenseMove]:
+    return [OFFENSE_MOVES[code] for code in frame]
+
+
+def encode_defense_move(move: DefenseMove, position: Position) -> bytes:
+    return _DEFENSE_MOVE.pack(position.x, position.y, DEFENSE_MOVES.index(move))
+
+
+def decode_defense_move(frame: bytes) -> tuple[DefenseMove, Position]:
+    x, y, code = _DEFENSE_MOVE.unpack(frame)
+    return DEFENSE_MOVES[code], Position(x, y)
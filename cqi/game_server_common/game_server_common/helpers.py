@@ -1,4 +1,5 @@
 import PIL.ImageColor
+import math
 import numpy as np
 import base64
 import io
@@ -14,62 +15,136 @@ def parse_base64(data: str) -> np.ndarray:
     image = Image.open(io.BytesIO(decoded))
     return np.array(image).swapaxes(0,1).astype(np.int32)
 
+
+def _pack_rgb(r, g, b):
+    return (r << 16) | (g << 8) | b
+
+
+def _build_color_lookup() -> tuple[np.ndarray, np.ndarray]:
+    packed_to_value = {_pack_rgb(*PIL.ImageColor.getrgb(color)): element.value for element, color in ELEMENT_TYPE_TO_COLOR.items()}
+    packed_colors = np.array(sorted(packed_to_value), dtype=np.int32)
+    values = np.array([packed_to_value[packed] for packed in packed_colors], dtype=np.int32)
+    return packed_colors, values
+
+
+PACKED_COLORS, PACKED_COLOR_VALUES = _build_color_lookup()
+ELEMENT_VALUES = np.array([element.value for element in ELEMENT_TYPE_TO_COLOR], dtype=np.int32)
+PACKED_COLOR_TO_ELEMENT = {int(packed): ElementType(value) for packed, value in zip(PACKED_COLORS, PACKED_COLOR_VALUES)}
+
+
 def rgb_to_element(r: int, g: int, b: int) -> ElementType | None:
-    hex_color = "#{:02x}{:02x}{:02x}".format(r, g, b).upper()
+    return PACKED_COLOR_TO_ELEMENT.get(_pack_rgb(int(r), int(g), int(b)))
 
-    for element, color in ELEMENT_TYPE_TO_COLOR.items():
-        if color == hex_color:
-            return element
-    
-    return None
+
+def _run_length(mask: np.ndarray) -> int:
+    """Length of the leading run of True values"""
+    ends = np.flatnonzero(~mask)
+    return int(ends[0]) if len(ends) > 0 else len(mask)
+
+
+BLOCK_SCAN_COLUMNS = 16
 
 
 def get_block_size(data: np.array, color: str) -> tuple[int, int] | None:
-    rgb_color = np.array(PIL.ImageColor.getrgb(color))
-
-    start: tuple[int, int] | None = None
-    for i in range(data.shape[0]):
-        for j in range(data.shape[1]):
-            if (data[i, j] == rgb_color).all():
-                start = (i, j)
-                break
-        if start is not None:
-            break
-
-    if start is None:
-        return None
-
-    size: list[int, int] = [data.shape[0] - start[0], data.shape[1] - start[1]]
-    for i in range(data.shape[0] - start[0]):
-        if (data[start[0] + i, start[1]] != rgb_color).any():
-            size[0] = i
-            break
-    for j in range(data.shape[1] - start[1]):
-        if (data[start[0], start[1] + j] != rgb_color).any():
-            size[1] = j
-            break
+    r, g, b = PIL.ImageColor.getrgb(color)
+
+    # Scans chunks of columns that double in size, stopping at the first chunk holding the color,
+    # so a block near the start is found without masking the whole image
+    x, columns = 0, BLOCK_SCAN_COLUMNS
+    while x < data.shape[0]:
+        chunk = data[x:x + columns]
+        mask = (chunk[..., 0] == r) & (chunk[..., 1] == g) & (chunk[..., 2] == b)
+
+        # argmax stops on the first match of a boolean array
+        start = mask.argmax()
+        if mask.flat[start]:
+            offset_x, start_y = np.unravel_index(start, mask.shape)
+            start_x = x + int(offset_x)
+            column = data[start_x:, start_y]
+            row = data[start_x, start_y:]
+            return (
+                _run_length((column[:, 0] == r) & (column[:, 1] == g) & (column[:, 2] == b)),
+                _run_length((row[:, 0] == r) & (row[:, 1] == g) & (row[:, 2] == b)),
+            )
+
+        x += columns
+        columns *= 2
+
+    return None
+
+
+def get_grid_block_size(data: np.ndarray) -> tuple[int, int]:
+    """Largest block size that aligns with every color change of the image"""
+    packed = _pack_rgb(*data[..., :3].astype(np.int32).transpose(2, 0, 1))
+
+    size: list[int] = []
+    for axis in range(2):
+        changes = np.flatnonzero((np.diff(packed, axis=axis) != 0).any(axis=1 - axis)) + 1
+        size.append(math.gcd(data.shape[axis], *changes.tolist()))
 
     return tuple(size)
 
 
+class BlockSizeCache:
+    """Block size detection that keeps the size once blocks of the given color were found"""
+    _detected: tuple[int, int] | None
+
+    def __init__(self) -> None:
+        self._detected = None
+
+    def get(self, data: np.ndarray, color: str) -> tuple[int, int]:
+        if self._detected is None:
+            # Blocks of the given color have an exact size, which holds for every frame geometry
+            self._detected = get_block_size(data, color)
+
+        if self._detected is not None:
+            return self._detected
+
+        # The grid size is only a guess for this frame, aligned walls make it too large, so detection is retried on the next one
+        return get_grid_block_size(data)
+
+
 def parse_data(data: np.ndarray, block_size: tuple[int, int]) -> tuple[Map, dict[ElementType, list[Position]]]:
     size = (data.shape[0] // block_size[0], data.shape[1] // block_size[1])
 
     half_block_width = block_size[0] // 2
     half_block_height = block_size[1] //2
 
-    element_positions = {ElementType.GOAL: [], ElementType.PLAYER_OFFENSE: []}
-    output_map = np.zeros(size).astype(np.int32)
-    
-    for i in range(size[0]):
-        for j in range(size[1]):
-            x = (i * block_size[0]) + half_block_width
-            y = (j * block_size[1]) + half_block_height
-            id = rgb_to_element(*data[x, y])
-            output_map[i, j] = id.value
-            
-            element = ElementType(id)
-            if element in element_positions:
-                element_positions[element].append(Position(i, j))
-
-    return Map(output_map), element_positions
+    # Sample the center pixel of every block
+    centers = data[half_block_width::block_size[0], half_block_height::block_size[1], :3][:size[0], :size[1]].astype(np.int32)
+    packed = _pack_rgb(centers[..., 0], centers[..., 1], centers[..., 2])
+
+    indices = np.searchsorted(PACKED_COLORS, packed).clip(max=len(PACKED_COLORS) - 1)
+    unknown = PACKED_COLORS[indices] != packed
+    if unknown.any():
+        i, j = np.argwhere(unknown)[0]
+        raise ValueError("Unknown color #{:06X} for block ({}, {})".format(int(packed[i, j]), i, j))
+
+    output_map = PACKED_COLOR_VALUES[indices]
+
+    map = Map(output_map)
+    return map, _get_element_positions(map)
+
+
+def parse_grid(data: str, shape: tuple[int, int]) -> tuple[Map, dict[ElementType, list[Position]]]:
+    """Decodes a map sent with the grid encoding, see game_server_common.map.encode_grid"""
+    return parse_grid_array(np.frombuffer(base64.b64decode(data), dtype=np.int8).reshape(shape))
+
+
+def parse_grid_array(grid: np.ndarray) -> tuple[Map, dict[ElementType, list[Position]]]:
+    """Map of a grid of element ids, as sent in the websocket frames"""
+    output_map = grid.astype(np.int32)
+
+    unknown = ~np.isin(output_map, ELEMENT_VALUES)
+    if unknown.any():
+        i, j = np.argwhere(unknown)[0]
+        raise ValueError("Unknown element id {} for block ({}, {})".format(output_map[i, j], i, j))
+
+    map = Map(output_map)
+    return map, _get_element_positions(map)
+
+
+def _get_element_positions(map: Map) -> dict[ElementType, list[Position]]:
+    # Sorted in the row-major order of a scan of the grid
+    return {element: sorted(map.get_positions(element), key=lambda position: (position.x, position.y))
+            for element in [ElementType.GOAL, ElementType.PLAYER_OFFENSE]}
@@ -3,10 +3,50 @@ import base64
 
 TILE_SIZE = 20
 
-from PIL import Image
+from PIL import Image, ImageColor
 from io import BytesIO
+from collections.abc import Iterable, Iterator, Set
 from dataclasses import dataclass
-from .base import ElementType, OffenseMove, Position
+from .base import ELEMENT_TYPE_TO_COLOR, ElementType, OffenseMove, Position
+
+
+COLOR_TABLE_OFFSET = -min(element.value for element in ElementType)
+
+
+def _build_color_table() -> np.ndarray:
+    """Maps each element id (shifted by COLOR_TABLE_OFFSET) to its RGB color, elements without color are drawn as background"""
+    table = np.empty((max(element.value for element in ElementType) + COLOR_TABLE_OFFSET + 1, 3), dtype=np.uint8)
+    table[:] = ImageColor.getrgb(ElementType.BACKGROUND.to_color())
+
+    for element, color in ELEMENT_TYPE_TO_COLOR.items():
+        table[element.value + COLOR_TABLE_OFFSET] = ImageColor.getrgb(color)
+
+    return table
+
+
+COLOR_TABLE = _build_color_table()
+
+
+def render_grid(grid: np.ndarray, tile_size: int = TILE_SIZE) -> Image.Image:
+    """Renders a grid of element ids, each tile being a tile_size square of its element color"""
+    image = Image.fromarray(COLOR_TABLE[grid.T + COLOR_TABLE_OFFSET])
+    if tile_size == 1:
+        return image
+
+    # Nearest neighbor upscaling by an integer factor expands each pixel to an exact tile_size block
+    return image.resize((image.width * tile_size, image.height * tile_size), Image.Resampling.NEAREST)
+
+
+def encode_image(image: Image.Image) -> bytes:
+    """Encodes an image as a base64 PNG"""
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue())
+
+
+def encode_grid(grid: np.ndarray) -> bytes:
+    """Encodes a grid of element ids as a base64 int8 buffer, in row-major (x, y) order"""
+    return base64.b64encode(grid.astype(np.int8).tobytes())
 
 
 @dataclass(eq=True, frozen=True)
@@ -25,11 +65,54 @@ class Tile:
     def __repr__(self) -> str:
         return self.element.name
 
+def _index_cells(grid: np.ndarray) -> dict[ElementType, set[int]]:
+    """Cells of each element type, numbered x * height + y, from a single sort of the grid"""
+    flat = grid.ravel()
+    order = np.argsort(flat, kind="stable")
+    values = flat[order]
+    bounds = [0, *(np.flatnonzero(np.diff(values)) + 1).tolist(), len(values)]
+
+    cells: dict[ElementType, set[int]] = {element_type: set() for element_type in ElementType}
+    for start, end in zip(bounds, bounds[1:]):
+        cells[ElementType(int(values[start]))] = set(order[start:end].tolist())
+    return cells
+
+
+class PositionSet(Set):
+    """Read-only view of the cells of an element type, following the changes made by Map.set()"""
+    __slots__ = ("_cells", "_height")
+
+    def __init__(self, cells: set[int], height: int) -> None:
+        self._cells = cells
+        self._height = height
+
+    @classmethod
+    def _from_iterable(cls, positions: Iterable[Position]) -> frozenset[Position]:
+        return frozenset(positions)
+
+    def __contains__(self, position: object) -> bool:
+        return isinstance(position, Position) and 0 <= position.y < self._height \
+            and position.x * self._height + position.y in self._cells
+
+    def __iter__(self) -> Iterator[Position]:
+        return (Position(*divmod(cell, self._height)) for cell in self._cells)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({set(self)!r})"
+
+
 class Map:
     map: np.ndarray
+    _cells: dict[ElementType, set[int]]
+    _positions: dict[ElementType, PositionSet]
 
     def __init__(self, map: np.ndarray) -> None:
         self.map = map
+        self._cells = _index_cells(map)
+        self._positions = {element_type: PositionSet(cells, map.shape[1]) for element_type, cells in self._cells.items()}
 
     def get(self, x: int, y: int) -> Tile | None:
         size_x, size_y = self.map.shape
@@ -42,26 +125,29 @@ class Map:
 
         size_x, size_y = self.map.shape
         if 0 <= x < size_x and 0 <= y < size_y:
+            cell = x * size_y + y
+            self._cells[ElementType(self.map[x, y])].discard(cell)
+            self._cells[element_type].add(cell)
             self.map[x, y] = element_type.value
             return True
         return False
+
+    def get_positions(self, element_type: ElementType) -> PositionSet:
+        """Positions of every tile of element_type, indexed at construction then kept up to date by set().
+        Changes made directly to the map array are not tracked."""
+        return self._positions[element_type]
+
+    def get_position(self, element_type: ElementType) -> Position | None:
+        """Position of a tile of element_type, for elements appearing at most once such as the player or the goal"""
+        return next(iter(self._positions[element_type]), None)
     
-    def to_img_64(self) -> bytes:
+    def to_img_64(self, tile_size: int = TILE_SIZE) -> bytes:
         """Creates a base64 image of the map"""
-        image = Image.new("RGB", (self.map.shape[0] * TILE_SIZE, self.map.shape[1] * TILE_SIZE), color = ElementType.BACKGROUND.to_color())
-
-        def img_paste(x :int, y: int, type: ElementType):
-            image.paste(type.to_color(), (x * TILE_SIZE, y * TILE_SIZE, (x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE))
-        
-        for x in range(self.map.shape[0]):
-            for y in range(self.map.shape[1]):
-                element_type = ElementType(self.map[x, y])
-                if element_type is not ElementType.BACKGROUND:
-                    img_paste(x, y, element_type)
-
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue())
+        return encode_image(render_grid(self.map, tile_size))
+
+    def to_grid_64(self) -> bytes:
+        """Creates a base64 int8 buffer of the map, see encode_grid"""
+        return encode_grid(self.map)
 
     def get_nearby_tiles(self, x: int, y: int) -> list[tuple[Tile, OffenseMove]]:
         if self.get(x, y) is None:
@@ -0,0 +1,194 @@
+from collections import deque
+from functools import lru_cache
+from typing import Iterable
+
+import numpy as np
+
+from .base import ElementType, Position
+
+PASSABLE_ELEMENTS = frozenset([ElementType.BACKGROUND, ElementType.GOAL, ElementType.LARGE_VISION])
+
+
+@lru_cache(maxsize=64)
+def get_neighbor_table(width: int, height: int) -> tuple[tuple[int, ...], ...]:
+    """Flat indices (x * height + y) of the neighbors of every cell, in +x, -x, +y, -y order"""
+    table: list[tuple[int, ...]] = []
+    for x in range(width):
+        for y in range(height):
+            index = x * height + y
+            neighbors: list[int] = []
+            if x + 1 < width:
+                neighbors.append(index + height)
+            if x > 0:
+                neighbors.append(index - height)
+            if y + 1 < height:
+                neighbors.append(index + 1)
+            if y > 0:
+                neighbors.append(index - 1)
+            table.append(tuple(neighbors))
+
+    return tuple(table)
+
+
+def get_passable_cells(grid: np.ndarray, passable: Iterable[ElementType]) -> list[bool]:
+    """Flat list telling whether each cell of the grid can be walked on"""
+    return np.isin(grid, [element.value for element in passable]).ravel().tolist()
+
+
+def _search(grid: np.ndarray, start: Position, end: Position, passable: Iterable[ElementType],
+            blocked: Position | None = None) -> tuple[list[int], int, bool]:
+    """Breadth-first search from start to end, going around blocked if given, returns the parent of each visited
+    cell (-1 otherwise), the cell where the search stopped and whether it is the end"""
+    width, height = grid.shape
+    neighbors = get_neighbor_table(width, height)
+    passable_cells = get_passable_cells(grid, passable)
+    if blocked is not None:
+        passable_cells[blocked.x * height + blocked.y] = False
+
+    start_index = start.x * height + start.y
+    end_index = end.x * height + end.y
+    passable_cells[end_index] = True
+
+    parents = [-1] * (width * height)
+    parents[start_index] = start_index
+    if start_index == end_index:
+        return parents, end_index, True
+
+    queue = deque([start_index])
+    index = start_index
+    while queue:
+        index = queue.popleft()
+        for next_index in neighbors[index]:
+            if passable_cells[next_index] and parents[next_index] < 0:
+                parents[next_index] = index
+                if next_index == end_index:
+                    return parents, end_index, True
+                queue.append(next_index)
+
+    return parents, index, False
+
+
+def _to_path(parents: list[int], index: int, height: int) -> list[Position]:
+    path: list[Position] = [Position(index // height, index % height)]
+    while parents[index] != index:
+        index = parents[index]
+        path.append(Position(index // height, index % height))
+
+    path.reverse()
+    return path
+
+
+def shortest_path(grid: np.ndarray, start: Position, end: Position, passable: Iterable[ElementType] = PASSABLE_ELEMENTS,
+                  fallback_to_last: bool = False) -> list[Position]:
+    """Shortest path from start to end (both included) moving through passable cells, the start and end cells
+    can be of any type. When end cannot be reached, returns an empty path or, if fallback_to_last is set,
+    the path to the last cell explored."""
+    parents, index, found = _search(grid, start, end, passable)
+    if not found and not fallback_to_last:
+        return []
+
+    return _to_path(parents, index, grid.shape[1])
+
+
+def path_exists(grid: np.ndarray, start: Position, end: Position, passable: Iterable[ElementType] = PASSABLE_ELEMENTS,
+                blocked: Position | None = None) -> bool:
+    """Whether end can be reached from start, as if the blocked cell was a wall"""
+    return _search(grid, start, end, passable, blocked)[2]
+
+
+def distance_field(grid: np.ndarray, source: Position, passable: Iterable[ElementType] = PASSABLE_ELEMENTS) -> list[int]:
+    """Number of moves from every cell to source through passable cells, indexed by flat index (x * height + y),
+    -1 for cells that cannot reach it. The source cell can be of any type."""
+    width, height = grid.shape
+    neighbors = get_neighbor_table(width, height)
+    passable_cells = get_passable_cells(grid, passable)
+
+    source_index = source.x * height + source.y
+    distances = [-1] * (width * height)
+    distances[source_index] = 0
+
+    queue = deque([source_index])
+    while queue:
+        index = queue.popleft()
+        distance = distances[index] + 1
+        for next_index in neighbors[index]:
+            if passable_cells[next_index] and distances[next_index] < 0:
+                distances[next_index] = distance
+                queue.append(next_index)
+
+    return distances
+
+
+class CutVertices:
+    """Articulation points of the passable cells connected to a root cell, found in one depth-first search (Tarjan).
+    Tells in constant time whether blocking a cell disconnects another one from the root."""
+    height: int
+    discovery: list[int]
+    finish: list[int]
+    separated_subtrees: dict[int, list[tuple[int, int]]]
+
+    def __init__(self, grid: np.ndarray, root: Position, passable: Iterable[ElementType] = PASSABLE_ELEMENTS) -> None:
+        width, height = grid.shape
+        neighbors = get_neighbor_table(width, height)
+        passable_cells = get_passable_cells(grid, passable)
+
+        root_index = root.x * height + root.y
+        passable_cells[root_index] = True
+
+        discovery = [-1] * (width * height)
+        finish = [-1] * (width * height)
+        low = [0] * (width * height)
+        separated_subtrees: dict[int, list[tuple[int, int]]] = {}
+
+        discovery[root_index] = 0
+        timer = 1
+        stack = [(root_index, -1, iter(neighbors[root_index]))]
+        while stack:
+            index, parent, children = stack[-1]
+            for next_index in children:
+                if not passable_cells[next_index]:
+                    continue
+                if discovery[next_index] < 0:
+                    discovery[next_index] = low[next_index] = timer
+                    timer += 1
+                    stack.append((next_index, index, iter(neighbors[next_index])))
+                    break
+                if next_index != parent and discovery[next_index] < low[index]:
+                    low[index] = discovery[next_index]
+            else:
+                stack.pop()
+                # Cells discovered since index form its subtree
+                finish[index] = timer - 1
+                if parent < 0:
+                    continue
+
+                if low[index] < low[parent]:
+                    low[parent] = low[index]
+                # The subtree only links back to the root through parent
+                if low[index] >= discovery[parent] and parent != root_index:
+                    separated_subtrees.setdefault(parent, []).append((discovery[index], finish[index]))
+
+        self.height = height
+        self.discovery = discovery
+        self.finish = finish
+        self.separated_subtrees = separated_subtrees
+
+    def is_connected(self, cell: Position) -> bool:
+        return self.discovery[cell.x * self.height + cell.y] >= 0
+
+    def separates(self, cell: Position, start: Position) -> bool:
+        """Whether blocking cell leaves no path from start to the root"""
+        start_discovery = self.discovery[start.x * self.height + start.y]
+        if start_discovery < 0:
+            return True
+
+        cell_index = cell.x * self.height + cell.y
+        return any(first <= start_discovery <= last for first, last in self.separated_subtrees.get(cell_index, []))
+
+    def get_separating_cells(self, start: Position) -> frozenset[Position] | None:
+        """Cells that lie on every path from start to the root, None if there is no path"""
+        if not self.is_connected(start):
+            return None
+
+        return frozenset(Position(index // self.height, index % self.height) for index in self.separated_subtrees
+                         if self.separates(Position(index // self.height, index % self.height), start))